@@ -0,0 +1,226 @@
+"""
+Benchmark the in-memory representations of generated profiles.
+
+Every representation generates ``n`` profiles and computes the usual
+statistics on them. For each run we report the wall time, the bytes
+allocated per record and the peak RSS of the process that did the work,
+and write everything as JSON so runs can be compared.
+
+Usage:
+    python benchmark_profiles.py --sizes 1000 100000 --output results.json
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from time import perf_counter
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+import session8
+from session8 import ProfileStats, ProfileTable, draw_profiles, make_fake, person_profile
+
+# Sizes benchmarked when none are given on the command line
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+
+# Records built under tracemalloc to measure the bytes per record
+BYTES_SAMPLE_SIZE = 10000
+
+
+class ProfileSlots:
+    """
+    Plain class with ``__slots__`` holding one profile.
+    """
+
+    __slots__ = ('age', 'lat', 'long', 'blood_type')
+
+    def __init__(self, age, lat, long, blood_type):
+        self.age = age
+        self.lat = lat
+        self.long = long
+        self.blood_type = blood_type
+
+
+@dataclass(slots=True)
+class ProfileDataclass:
+    """
+    Slotted dataclass holding one profile.
+    """
+
+    age: int
+    lat: Decimal
+    long: Decimal
+    blood_type: str
+
+
+def _build_records(record_type, num_people, seed):
+    """
+    Generate profiles with Faker and store them as ``record_type`` instances.
+
+    Args:
+        record_type (callable): Called with age, lat, long and blood type.
+        num_people (int): The number of profiles to generate.
+        seed (int): Seed of the Faker instance.
+
+    Returns:
+        tuple: The generated records.
+    """
+    instance = make_fake(seed)
+    return tuple(record_type(*profile) for profile in draw_profiles(instance, num_people))
+
+
+def _build_dicts(num_people, seed):
+    """
+    Generate profiles with Faker and store them as dictionaries.
+    """
+    instance = make_fake(seed)
+    return [profile._asdict() for profile in draw_profiles(instance, num_people)]
+
+
+def _build_table(num_people, seed):
+    """
+    Generate profiles with Faker and store them in a ``ProfileTable``.
+    """
+    instance = make_fake(seed)
+    return ProfileTable(draw_profiles(instance, num_people))
+
+
+def _attribute_stats(records):
+    """
+    Compute statistics of records with age/lat/long/blood_type attributes.
+    """
+    stats = ProfileStats()
+    for record in records:
+        stats.add(record.age, record.lat, record.long, record.blood_type)
+    return stats.summary()
+
+
+def _dict_stats(records):
+    """
+    Compute statistics of profile dictionaries.
+    """
+    stats = ProfileStats()
+    for record in records:
+        stats.add(record['age'], record['lat'], record['long'], record['blood_type'])
+    return stats.summary()
+
+
+# Representation name mapped to its (build, stats) functions
+REPRESENTATIONS = {
+    'namedtuple': (lambda n, seed: _build_records(person_profile, n, seed), _attribute_stats),
+    'dict': (_build_dicts, _dict_stats),
+    'slots': (lambda n, seed: _build_records(ProfileSlots, n, seed), _attribute_stats),
+    'dataclass': (lambda n, seed: _build_records(ProfileDataclass, n, seed), _attribute_stats),
+    'table': (_build_table, ProfileTable.summary),
+    'columnar': (lambda n, seed: session8.generate_profiles_columnar(n, seed), session8.columnar_profile_stats),
+}
+
+
+def _bytes_per_record(name, num_people, seed):
+    """
+    Measure the memory allocated per record with tracemalloc on a sample.
+
+    Only the memory still held by the records counts: a warm-up build does
+    the one-time imports and caching first, and the Faker instance of the
+    sample build, which only a reference cycle keeps alive after the build,
+    is collected before reading the traced memory.
+    """
+    build, _ = REPRESENTATIONS[name]
+    sample_size = min(num_people, BYTES_SAMPLE_SIZE)
+    build(1, seed)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        records = build(sample_size, seed)
+        gc.collect()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del records
+    return allocated / sample_size
+
+
+def run_benchmark(name, num_people, seed=0):
+    """
+    Time generation plus statistics of one representation.
+
+    Meant to run in a fresh process so that the peak RSS belongs to this
+    run only.
+
+    Args:
+        name (str): Key of ``REPRESENTATIONS``.
+        num_people (int): The number of profiles to generate.
+        seed (int): Seed of the generator.
+
+    Returns:
+        dict: Representation, size, timings in seconds, bytes per record and RSS in bytes
+        (None on platforms without ``resource``).
+    """
+    build, stats = REPRESENTATIONS[name]
+    baseline_rss = session8.peak_rss_bytes()
+
+    start = perf_counter()
+    records = build(num_people, seed)
+    built = perf_counter()
+    stats(records)
+    stop = perf_counter()
+    peak_rss = session8.peak_rss_bytes()
+    del records
+
+    return {
+        'representation': name,
+        'num_people': num_people,
+        'generate_seconds': built - start,
+        'stats_seconds': stop - built,
+        'total_seconds': stop - start,
+        'bytes_per_record': _bytes_per_record(name, num_people, seed),
+        'baseline_rss_bytes': baseline_rss,
+        'peak_rss_bytes': peak_rss,
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, representations=tuple(REPRESENTATIONS), seed=0):
+    """
+    Benchmark every representation at every size, each run in its own process.
+
+    Args:
+        sizes (iterable): Numbers of profiles to benchmark.
+        representations (iterable): Keys of ``REPRESENTATIONS``.
+        seed (int): Seed of the generator.
+
+    Returns:
+        list: One ``run_benchmark`` result per (representation, size).
+    """
+    results = []
+    for num_people in sizes:
+        for name in representations:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                results.append(executor.submit(run_benchmark, name, num_people, seed).result())
+    return results
+
+
+def main(argv=None):
+    """
+    Run the suite from the command line and write the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--representations', nargs='+', choices=tuple(REPRESENTATIONS),
+                        default=tuple(REPRESENTATIONS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write, stdout if omitted')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.representations, args.seed)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,37 @@
-from faker import Faker
-from faker.providers import BaseProvider  # Import BaseProvider for custom providers
-from collections import namedtuple
+"""
+Fake profile and stock market generation with Faker.
+
+Importing this module is kept cheap: Faker, NumPy and the process pool
+are only imported when first needed, and the default ``fake`` instance,
+``companies`` and market values are created on first attribute access.
+"""
+from array import array
+from collections import Counter, namedtuple
+from itertools import islice, product
+import string
 import random
 from decimal import Decimal
-from time import perf_counter
+import math
+import operator
+from time import perf_counter, perf_counter_ns
+import atexit
+import contextvars
+import functools
+import sys
+import types
+
+# Blood groups in code order, code ``i`` maps to ``BLOOD_GROUPS[i]``
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+
+# Approximate share of each blood group in the US population, in percent,
+# usable as ``weights`` for BloodGroupProvider.blood_groups
+BLOOD_GROUP_FREQUENCIES = (35.7, 6.3, 8.5, 1.5, 3.4, 0.6, 37.4, 6.6)
+
+# Ages drawn by AgeProvider
+AGES = range(0, 100, 1)
 
 
-class BloodGroupProvider(BaseProvider):
+class _BloodGroupMethods:
     """
     Custom provider for generating random blood groups.
 
@@ -21,11 +46,24 @@ class BloodGroupProvider(BaseProvider):
         Returns:
             str: A randomly selected blood group from the list.
         """
-        blood_groups = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-        return random.choice(blood_groups)
+        return self.generator.random.choice(BLOOD_GROUPS)
+
+    def blood_groups(self, n, weights=None):
+        """
+        Generate many random blood groups with a single draw.
+
+        Args:
+            n (int): Number of blood groups to generate.
+            weights (sequence, optional): Relative weight of each entry of
+                ``BLOOD_GROUPS``, e.g. ``BLOOD_GROUP_FREQUENCIES``. Uniform if omitted.
+
+        Returns:
+            list: ``n`` randomly selected blood groups.
+        """
+        return self.generator.random.choices(BLOOD_GROUPS, weights=weights, k=n)
 
 
-class AgeProvider(BaseProvider):
+class _AgeMethods:
     """
     Custom provider for generating random ages.
 
@@ -40,212 +78,3871 @@ class AgeProvider(BaseProvider):
         Returns:
             int: A randomly selected age from the range of 0 to 99.
         """
-        ages = range(0,100, 1)
-        return random.choice(ages)
+        return self.generator.random.choice(AGES)
+
+    def random_ages(self, n, weights=None):
+        """
+        Generate many random ages with a single draw.
+
+        Args:
+            n (int): Number of ages to generate.
+            weights (sequence, optional): Relative weight of each age from
+                0 to 99, e.g. an age pyramid. Uniform if omitted.
+
+        Returns:
+            list: ``n`` randomly selected ages.
+        """
+        return self.generator.random.choices(AGES, weights=weights, k=n)
+
+
+# Faker providers created by __getattr__ on first access, which imports Faker,
+# from BaseProvider and the methods of each class
+_PROVIDER_METHODS = {'BloodGroupProvider': _BloodGroupMethods, 'AgeProvider': _AgeMethods}
+
+
+def make_fake(seed=None):
+    """
+    Create a Faker instance with the custom providers registered.
+
+    Args:
+        seed (int | str, optional): If given, the instance gets its own
+            random generator seeded with this value.
+
+    Returns:
+        Faker: The configured Faker instance.
+    """
+    from faker import Faker
+
+    instance = Faker()
+
+    # Add the custom blood group and age providers to the Faker instance
+    for name in _PROVIDER_METHODS:
+        instance.add_provider(globals().get(name) or __getattr__(name))
+    if seed is not None:
+        instance.seed_instance(seed)
+    return instance
+
+
+def get_fake():
+    """
+    Return the module's default Faker instance, creating it on first use.
+
+    The instance is the module attribute ``fake``, so assigning or patching
+    ``session8.fake`` changes what the generators draw from.
 
+    Returns:
+        Faker: The default instance, also available as ``session8.fake``.
+    """
+    if 'fake' not in globals():
+        globals()['fake'] = make_fake()
+    return globals()['fake']
+
+
+def _require_numpy():
+    """
+    Import NumPy, which only the columnar helpers need.
 
-# Initialize the Faker object
-fake = Faker()
+    Returns:
+        module: The ``numpy`` module.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('The columnar profile helpers require numpy') from None
+    return numpy
 
-# Add the custom blood group and age providers to the Faker instance
-fake.add_provider(BloodGroupProvider)
-fake.add_provider(AgeProvider)
 
 # Define a named tuple for person profiles
 person_profile = namedtuple('person_profile', ['age', 'lat', 'long', 'blood_type'])
 
-def time_the_fun(fn):
+# Blood group mapped to its one-byte code
+BLOOD_GROUP_CODES = {group: code for code, group in enumerate(BLOOD_GROUPS)}
+
+# Define a named tuple for the summary statistics of a set of profiles
+ProfileSummary = namedtuple('ProfileSummary', ['largest_blood_type', 'mean_lat', 'mean_long',
+                                               'largest_age', 'mean_age', 'blood_group_dict'])
+
+# Define a named tuple holding profiles as contiguous columns
+ProfileColumns = namedtuple('ProfileColumns', ['age', 'lat', 'long', 'blood_type'])
+
+# Numeric representations available for coordinates and their sums
+NUMERIC_BACKENDS = ('decimal', 'float', 'fixed')
+
+# Units per degree of the 'fixed' backend. Faker latitudes are half of a
+# whole-microdegree draw, so tenths of a microdegree represent them exactly.
+FIXED_POINT_SCALE = 10 ** 7
+
+# Number of float coordinates buffered before they are folded with math.fsum
+FSUM_BUFFER_SIZE = 4096
+
+
+def _coordinates(lat_draw, long_draw, backend):
     """
-    Decorator function to measure the execution time of a function.
+    Map two whole-microdegree draws in [-180000000, 180000000] to a latitude and longitude.
+
+    The latitude is half of its draw, as in Faker's ``latitude()``.
 
     Args:
-        fn (callable): The function to be timed.
+        lat_draw (int): Draw of the latitude.
+        long_draw (int): Draw of the longitude.
+        backend (str): 'decimal' for the ``Decimal`` values of Faker's
+            ``latitude()``/``longitude()``, exponents included, 'float' for
+            floats in degrees, 'fixed' for ints in ``FIXED_POINT_SCALE`` units.
 
     Returns:
-        callable: The decorated function that measures the execution time.
+        tuple: The latitude and longitude.
     """
-    def inner(*args, **kwargs):
-        start = perf_counter()
-        return_fn = fn(*args, **kwargs)
-        stop = perf_counter()
-        print(f'Time taken to execute {fn.__name__} is {stop-start}')
-        return return_fn
-    return inner
+    if backend == 'decimal':
+        return Decimal(lat_draw).scaleb(-6) / 2, Decimal(long_draw).scaleb(-6)
+    if backend == 'float':
+        return lat_draw / 2000000, long_draw / 1000000
+    if backend == 'fixed':
+        return lat_draw * (FIXED_POINT_SCALE // 2000000), long_draw * (FIXED_POINT_SCALE // 1000000)
+    raise ValueError(f'Unknown numeric backend {backend!r}, expected one of {NUMERIC_BACKENDS}')
 
 
-@time_the_fun
-def generate_fake_profiles_and_stats_tuple(num_people: int):
+# Number of profiles whose ages and blood groups draw_profiles draws at once
+PROFILE_BATCH_SIZE = 4096
+
+
+def draw_profiles(instance, num_people, backend='decimal', age_weights=None, blood_group_weights=None):
     """
-    Generate fake profiles and compute statistics.
+    Lazily draw many profiles, taking ages and blood groups in bulk.
 
-    This function generates a specified number of fake profiles,
-    calculates the mean latitude, mean longitude, mean age, largest
-    age, and counts the occurrences of each blood type.
+    Ages and blood groups are drawn ``PROFILE_BATCH_SIZE`` at a time with
+    ``random_ages``/``blood_groups``, coordinates one profile at a time
+    with the same draws as Faker's ``latitude()``/``longitude()``, made on
+    the instance's Random directly to skip Faker's dispatch. All backends
+    consume the random stream the same way, so for a given seed they
+    describe the same profiles.
 
     Args:
-        num_people (int): The number of fake profiles to generate.
+        instance (Faker): Faker instance created by ``make_fake``.
+        num_people (int): The number of profiles to draw.
+        backend (str): Numeric backend of the coordinates, one of ``NUMERIC_BACKENDS``.
+        age_weights (sequence, optional): Weights of the ages 0 to 99.
+        blood_group_weights (sequence, optional): Weights of ``BLOOD_GROUPS``.
 
-    Prints:
-        - Largest blood type by count
-        - Mean latitude
-        - Mean longitude
-        - Largest age
-        - Mean age
-        - Count of each blood type
+    Yields:
+        person_profile: The generated profiles.
     """
-    # Generate fake profiles
-    profiles = tuple(
-        person_profile(fake.random_age(), fake.latitude(), fake.longitude(), fake.blood_group())
-        for _ in range(num_people)
-    )
+    if backend not in NUMERIC_BACKENDS:
+        raise ValueError(f'Unknown numeric backend {backend!r}, expected one of {NUMERIC_BACKENDS}')
 
-    # Initialize accumulators for statistics
-    sum_lat = Decimal('0')
-    sum_long = Decimal('0')
-    sum_age = 0
-    largest_age = 0
-    blood_group_dict = {'A+': 0, 'A-': 0, 'B+': 0, 'B-': 0, 'AB+': 0, 'AB-': 0, 'O+': 0, 'O-': 0}
+    randint = instance.random.randint
+    for start in range(0, num_people, PROFILE_BATCH_SIZE):
+        size = min(PROFILE_BATCH_SIZE, num_people - start)
+        ages = instance.random_ages(size, age_weights)
+        blood_types = instance.blood_groups(size, blood_group_weights)
+        for age, blood_type in zip(ages, blood_types):
+            lat, long = _coordinates(randint(-180000000, 180000000), randint(-180000000, 180000000), backend)
+            yield person_profile(age, lat, long, blood_type)
 
-    # Calculate statistics from profiles
-    for profile in profiles:
-        sum_lat += profile.lat
-        sum_long += profile.long
-        sum_age += profile.age
-        if profile.age > largest_age:
-            largest_age = profile.age
-        blood_group_dict[profile.blood_type] += 1
 
-    # Calculate means
-    mean_lat = sum_lat / len(profiles)
-    mean_long = sum_long / len(profiles)
-    mean_age = sum_age / len(profiles)
+# Constants of the SplitMix64 generator behind the counter-based profiles
+_SPLITMIX_GAMMA = 0x9E3779B97F4A7C15
+_SPLITMIX_MASK = (1 << 64) - 1
 
-    # Print statistics
-    print(f'Largest blood type = {sorted(blood_group_dict.items(), key=lambda item: item[1], reverse=True)[0][0]}')
-    print(f'Mean latitude = {mean_lat}')
-    print(f'Mean longitude = {mean_long}')
-    print(f'Largest age = {largest_age}')
-    print(f'Mean age = {mean_age}')
-    print(blood_group_dict)
+# Random 64-bit words drawn per counter-based profile: age, latitude, longitude, blood group
+_COUNTER_WORDS = 4
 
-    return profiles
+# Number of distinct whole-microdegree coordinate draws in [-180, 180]
+_COORDINATE_DRAWS = 360000001
 
 
-@time_the_fun
-def generate_fake_profiles_and_stats_dict(num_people: int):
+@functools.lru_cache(maxsize=64)
+def _counter_key(seed):
     """
-    Generate fake profiles and compute statistics.
+    Derive the 64-bit key of a counter-based stream from an int or str seed.
+    """
+    import hashlib
 
-    This function generates a specified number of fake profiles,
-    calculates the mean latitude, mean longitude, mean age, largest
-    age, and counts the occurrences of each blood type.
+    return int.from_bytes(hashlib.blake2b(repr(seed).encode(), digest_size=8).digest(), 'little')
 
-    Args:
-        num_people (int): The number of fake profiles to generate.
 
-    Prints:
-        - Largest blood type by count
-        - Mean latitude
-        - Mean longitude
-        - Largest age
-        - Mean age
-        - Count of each blood type
+def _splitmix(key, counter):
     """
-    # Generate fake profiles as a list of dictionaries
-    profiles = [{
-        'age': fake.random_age(),
-        'lat': fake.latitude(),
-        'long': fake.longitude(),
-        'blood_type': fake.blood_group()
-    } for _ in range(num_people)]
+    Return the 64-bit SplitMix64 output for ``counter`` in the stream of ``key``.
+    """
+    z = (key + (counter + 1) * _SPLITMIX_GAMMA) & _SPLITMIX_MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _SPLITMIX_MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _SPLITMIX_MASK
+    return z ^ (z >> 31)
 
-    # Initialize accumulators for statistics
-    sum_lat = Decimal('0')
-    sum_long = Decimal('0')
-    sum_age = 0
-    largest_age = 0
-    blood_group_dict = {'A+': 0, 'A-': 0, 'B+': 0, 'B-': 0, 'AB+': 0, 'AB-': 0, 'O+': 0, 'O-': 0}
 
-    # Calculate statistics from profiles
-    for index in range(len(profiles)):
-        sum_lat += profiles[index]['lat']
-        sum_long += profiles[index]['long']
-        sum_age += profiles[index]['age']
-        if profiles[index]['age'] > largest_age:
-            largest_age = profiles[index]['age']
-        blood_group_dict[profiles[index]['blood_type']] += 1
+def profile_at(seed, index, backend='decimal'):
+    """
+    Generate profile ``index`` of the counter-based stream of ``seed``.
 
-    # Calculate means
-    mean_lat = sum_lat / len(profiles)
-    mean_long = sum_long / len(profiles)
-    mean_age = sum_age / len(profiles)
+    Each profile is a pure function of ``(seed, index)``: its four random
+    words are SplitMix64 outputs for counters ``4 * index`` to
+    ``4 * index + 3``, mapped to ranges with a 64-bit multiply-shift. Any
+    record can therefore be regenerated without the ones before it. The
+    distributions match ``draw_profiles``: ages 0..99, longitudes in whole
+    microdegrees, latitudes half of such a draw, uniform blood groups.
+    ``profiles_range`` and ``profiles_range_columnar`` give the same values.
 
-    # Print statistics
-    print(f'Largest blood type = {sorted(blood_group_dict.items(), key=lambda item: item[1], reverse=True)[0][0]}')
-    print(f'Mean latitude = {mean_lat}')
-    print(f'Mean longitude = {mean_long}')
-    print(f'Largest age = {largest_age}')
-    print(f'Mean age = {mean_age}')
-    print(blood_group_dict)
+    This is a stream of its own: the Faker-based generators
+    (``draw_profiles``, ``agenerate_profiles`` and the default sharded and
+    command line runs) give different profiles for the same seed. Only
+    ``generate_profile_stats_sharded(..., counter=True)`` and the 'counter'
+    representation of ``generation_summary`` produce this stream.
 
-# Define a namedtuple for storing company stock data
-CompanyStock = namedtuple('CompanyStock', ['name', 'symbol', 'open', 'high', 'close', 'weight'])
+    Args:
+        seed (int | str): Seed of the stream.
+        index (int): Position of the profile, from 0.
+        backend (str): Numeric backend of the coordinates, one of ``NUMERIC_BACKENDS``.
 
-# Generate stock data for 100 companies
-def generate_companies(num_companies=100):
+    Returns:
+        person_profile: The profile.
     """
-    Generate fake stock data for a specified number of companies.
+    if index < 0:
+        raise ValueError('index must not be negative')
+    key = _counter_key(seed)
+    counter = index * _COUNTER_WORDS
+    age = (_splitmix(key, counter) * len(AGES)) >> 64
+    lat, long = _coordinates(((_splitmix(key, counter + 1) * _COORDINATE_DRAWS) >> 64) - 180000000,
+                             ((_splitmix(key, counter + 2) * _COORDINATE_DRAWS) >> 64) - 180000000, backend)
+    blood_type = BLOOD_GROUPS[(_splitmix(key, counter + 3) * len(BLOOD_GROUPS)) >> 64]
+    return person_profile(age, lat, long, blood_type)
+
+
+def profiles_range(seed, start, stop, backend='decimal'):
+    """
+    Lazily generate profiles ``start`` to ``stop - 1`` of the counter-based stream of ``seed``.
+
+    ``profiles_range(seed, 0, n)`` is the sequential run of the stream,
+    and any slice of it can be regenerated on its own, e.g. by a shard.
+    It is not the stream of ``draw_profiles`` for the same seed, see ``profile_at``.
 
     Args:
-        num_companies (int): The number of companies to generate data for. Default is 100.
+        seed (int | str): Seed of the stream.
+        start (int): Index of the first profile.
+        stop (int): Index after the last profile.
+        backend (str): Numeric backend of the coordinates, one of ``NUMERIC_BACKENDS``.
 
-    Returns:
-        list: A list of CompanyStock namedtuples containing the company name, symbol,
-              open price, high price, close price, and assigned weight.
-        float: The total weight of all companies combined.
+    Yields:
+        person_profile: The profiles, equal to ``profile_at(seed, i)`` for each ``i``.
     """
-    companies = []
-    total_weight = 0
+    for index in range(start, stop):
+        yield profile_at(seed, index, backend)
 
-    for _ in range(num_companies):
-        # Generate company name and symbol
-        name = fake.company()
-        symbol = ''.join(random.sample(name, 4)).upper()  # Create a 4-letter symbol from the company name
 
-        # Generate random stock prices
-        open_price = round(random.uniform(100, 500), 2)  # Random open price between 100 and 500
-        high_price = round(open_price + random.uniform(0, 50), 2)  # High price must be higher than open price
-        close_price = round(random.uniform(open_price, high_price), 2)  # Close price between open and high
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch (KLL).
 
-        # Assign a random weight
-        weight = random.uniform(0.5, 2.0)
-        total_weight += weight
+    Values go into a stack of compactors. When the sketch is full, the
+    lowest full compactor is sorted and every other value, starting at a
+    random offset, moves one level up with twice the weight. Compactor
+    capacities shrink geometrically (factor 2/3) towards the bottom, so
+    the sketch holds about ``3 * k`` values plus a few per doubling of
+    the stream, whatever its length.
 
-        # Append company data to the list
-        companies.append(CompanyStock(name, symbol, open_price, high_price, close_price, weight))
+    Error bound: the rank of a returned quantile is within about
+    ``1.7 / k`` of the requested one with 99% probability, i.e. about
+    0.85% for the default ``k=200``. Sketches built with the same ``k``
+    merge without losing that guarantee, and streams shorter than ``k``
+    are answered exactly.
+    """
 
-    return companies, total_weight
+    def __init__(self, k=200, seed=None):
+        """
+        Args:
+            k (int): Size of the top compactor; the error is proportional to ``1 / k``.
+            seed (int | str, optional): Seed of the random compaction offsets.
+        """
+        self.k = k
+        self.count = 0
+        self.compactors = []
+        self._size = 0
+        self._max_size = 0
+        self._random = random.Random(seed)
+        self._grow()
 
+    def _capacity(self, height):
+        return int(math.ceil((2 / 3) ** (len(self.compactors) - height - 1) * self.k)) + 1
 
-# Calculate the stock market values
-def calculate_stock_market_value(companies, total_weight):
+    def _grow(self):
+        self.compactors.append([])
+        self._max_size = sum(self._capacity(height) for height in range(len(self.compactors)))
+
+    def _compress(self):
+        for height, compactor in enumerate(self.compactors):
+            if len(compactor) >= self._capacity(height):
+                if height + 1 >= len(self.compactors):
+                    self._grow()
+                compactor.sort()
+                # An odd value out stays at this level
+                start = len(compactor) % 2
+                offset = start + (self._random.random() < 0.5)
+                self.compactors[height + 1].extend(compactor[offset::2])
+                del compactor[start:]
+                break
+        self._size = sum(len(compactor) for compactor in self.compactors)
+
+    def update(self, value):
+        """
+        Add one value.
+
+        Args:
+            value: Any value that can be ordered with the others.
+        """
+        self.compactors[0].append(value)
+        self.count += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Fold another sketch into this one.
+
+        Args:
+            other (QuantileSketch): Sketch of another part of the stream, built with the same ``k``.
+
+        Returns:
+            QuantileSketch: ``self``, to allow chaining.
+        """
+        if other.k != self.k:
+            raise ValueError(f'Cannot merge a sketch with k={other.k} into one with k={self.k}')
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for compactor, other_compactor in zip(self.compactors, other.compactors):
+            compactor.extend(other_compactor)
+        self.count += other.count
+        self._size = sum(len(compactor) for compactor in self.compactors)
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate a quantile of the values seen so far.
+
+        Args:
+            q (float): Quantile between 0 and 1, e.g. 0.5 for the median.
+
+        Returns:
+            The smallest retained value whose estimated rank reaches ``q``.
+        """
+        if self.count == 0:
+            raise ValueError('Cannot compute quantiles of an empty sketch')
+        if not 0 <= q <= 1:
+            raise ValueError('q must be between 0 and 1')
+
+        weighted = sorted((value, 1 << height) for height, compactor in enumerate(self.compactors)
+                          for value in compactor)
+        target = q * self.count
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+
+# Profile fields tracked by the quantile sketches of ProfileStats
+QUANTILE_FIELDS = ('age', 'lat', 'long')
+
+
+class ProfileStats:
+    """
+    Single-pass, mergeable accumulator for profile statistics.
+
+    Only running sums, the largest age and the blood group counts are
+    kept, so any number of profiles can be consumed from an iterator in
+    constant memory. Partial results computed on separate shards can be
+    combined with ``merge``.
+
+    The ``backend`` selects how coordinates are summed: 'decimal' adds
+    ``Decimal`` values exactly, 'fixed' adds integer ``FIXED_POINT_SCALE``
+    units exactly and reports ``Decimal`` means identical to 'decimal',
+    and 'float' buffers floats and folds them with ``math.fsum``.
+
+    With ``quantiles=True`` a ``QuantileSketch`` per field of
+    ``QUANTILE_FIELDS`` is kept as well, for medians and tail percentiles
+    in bounded memory; the sketches are merged along with the sums.
     """
-    Calculate the stock market's open, high, and close values based on the weighted average
-    of each company's stock prices.
+
+    def __init__(self, backend='decimal', quantiles=False, sketch_k=200, seed=None):
+        """
+        Args:
+            backend (str): Numeric backend, one of ``NUMERIC_BACKENDS``.
+            quantiles (bool): Whether to keep quantile sketches of age, latitude and longitude.
+            sketch_k (int): ``k`` of the quantile sketches.
+            seed (int | str, optional): Seed of the quantile sketches.
+        """
+        if backend not in NUMERIC_BACKENDS:
+            raise ValueError(f'Unknown numeric backend {backend!r}, expected one of {NUMERIC_BACKENDS}')
+        self.backend = backend
+        self.count = 0
+        self.sum_lat = 0
+        self.sum_long = 0
+        self.sum_age = 0
+        self.largest_age = 0
+        self.blood_group_dict = dict.fromkeys(BLOOD_GROUPS, 0)
+        self._lat_buffer = [] if backend == 'float' else None
+        self._long_buffer = [] if backend == 'float' else None
+        self.sketches = None
+        if quantiles:
+            self.sketches = {field: QuantileSketch(sketch_k, f'{seed}:{field}' if seed is not None else None)
+                             for field in QUANTILE_FIELDS}
+
+    def add(self, age, lat, long, blood_type):
+        """
+        Add a single profile to the statistics.
+
+        Args:
+            age (int): Age of the person.
+            lat (Decimal | float | int): Latitude of the person in the backend's representation.
+            long (Decimal | float | int): Longitude of the person in the backend's representation.
+            blood_type (str): Blood group of the person.
+        """
+        self.count += 1
+        if self.sketches is not None:
+            self.sketches['age'].update(age)
+            self.sketches['lat'].update(lat)
+            self.sketches['long'].update(long)
+        if self._lat_buffer is None:
+            self.sum_lat += lat
+            self.sum_long += long
+        else:
+            self._lat_buffer.append(lat)
+            self._long_buffer.append(long)
+            if len(self._lat_buffer) >= FSUM_BUFFER_SIZE:
+                self._flush()
+        self.sum_age += age
+        if age > self.largest_age:
+            self.largest_age = age
+        self.blood_group_dict[blood_type] += 1
+
+    def update(self, profiles):
+        """
+        Consume profiles from any iterable without storing them.
+
+        Args:
+            profiles (iterable): ``person_profile`` namedtuples or profile dictionaries.
+
+        Returns:
+            ProfileStats: ``self``, to allow chaining.
+        """
+        for profile in profiles:
+            if isinstance(profile, dict):
+                self.add(**profile)
+            else:
+                self.add(*profile)
+        return self
+
+    def _flush(self):
+        """
+        Fold the buffered float coordinates into the running sums.
+        """
+        if self._lat_buffer:
+            self._lat_buffer.append(self.sum_lat)
+            self._long_buffer.append(self.sum_long)
+            self.sum_lat = math.fsum(self._lat_buffer)
+            self.sum_long = math.fsum(self._long_buffer)
+            self._lat_buffer.clear()
+            self._long_buffer.clear()
+
+    def merge(self, other):
+        """
+        Fold the statistics of another accumulator into this one.
+
+        Args:
+            other (ProfileStats): Partial statistics, e.g. from another shard.
+
+        Returns:
+            ProfileStats: ``self``, to allow chaining.
+        """
+        if other.backend != self.backend:
+            raise ValueError(f'Cannot merge {other.backend!r} statistics into {self.backend!r} statistics')
+        if (other.sketches is None) != (self.sketches is None):
+            raise ValueError('Cannot merge statistics with and without quantile sketches')
+
+        if self.sketches is not None:
+            for field, sketch in self.sketches.items():
+                sketch.merge(other.sketches[field])
+
+        self.count += other.count
+        if self._lat_buffer is None:
+            self.sum_lat += other.sum_lat
+            self.sum_long += other.sum_long
+        else:
+            self._flush()
+            other._flush()
+            self.sum_lat = math.fsum((self.sum_lat, other.sum_lat))
+            self.sum_long = math.fsum((self.sum_long, other.sum_long))
+        self.sum_age += other.sum_age
+        if other.largest_age > self.largest_age:
+            self.largest_age = other.largest_age
+        for blood_type, count in other.blood_group_dict.items():
+            self.blood_group_dict[blood_type] += count
+        return self
+
+    def quantile(self, field, q):
+        """
+        Estimate a quantile of a profile field.
+
+        Args:
+            field (str): One of ``QUANTILE_FIELDS``.
+            q (float): Quantile between 0 and 1, e.g. 0.9 for p90.
+
+        Returns:
+            The estimated quantile, in the backend's representation except
+            that 'fixed' coordinates are converted back to ``Decimal`` degrees.
+        """
+        if self.sketches is None:
+            raise ValueError('Quantiles need ProfileStats(quantiles=True)')
+        value = self.sketches[field].quantile(q)
+        if self.backend == 'fixed' and field != 'age':
+            return Decimal(value) / FIXED_POINT_SCALE
+        return value
+
+    def quantiles(self, field, qs=(0.5, 0.9, 0.99)):
+        """
+        Estimate several quantiles of a profile field.
+
+        Returns:
+            dict: Each of ``qs`` mapped to its estimated quantile.
+        """
+        return {q: self.quantile(field, q) for q in qs}
+
+    def summary(self):
+        """
+        Compute the final statistics.
+
+        Returns:
+            ProfileSummary: Largest blood type, mean latitude, mean longitude,
+            largest age, mean age and the count of each blood type.
+        """
+        if self.count == 0:
+            raise ValueError('Cannot compute statistics of zero profiles')
+
+        if self.backend == 'fixed':
+            mean_lat = Decimal(self.sum_lat) / (self.count * FIXED_POINT_SCALE)
+            mean_long = Decimal(self.sum_long) / (self.count * FIXED_POINT_SCALE)
+        else:
+            if self._lat_buffer is not None:
+                self._flush()
+            mean_lat = self.sum_lat / self.count
+            mean_long = self.sum_long / self.count
+
+        return ProfileSummary(
+            largest_blood_type=sorted(self.blood_group_dict.items(), key=lambda item: item[1], reverse=True)[0][0],
+            mean_lat=mean_lat,
+            mean_long=mean_long,
+            largest_age=self.largest_age,
+            mean_age=self.sum_age / self.count,
+            blood_group_dict=dict(self.blood_group_dict),
+        )
+
+
+# Aggregates computed per group and field by GroupByStats and columnar_group_by
+GROUP_AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+
+# Position of each field in a person_profile
+_PROFILE_FIELD_INDEX = {field: index for index, field in enumerate(person_profile._fields)}
+
+
+def age_band(width=10):
+    """
+    Key function grouping profiles into age bands.
+
+    The key works on single profiles and on ``ProfileColumns`` alike, so it
+    can be passed to ``GroupByStats`` as well as ``columnar_group_by``.
 
     Args:
-        companies (list): A list of CompanyStock namedtuples containing stock data for each company.
-        total_weight (float): The sum of the weights of all companies.
+        width (int): Width of a band in years.
 
     Returns:
-        tuple: A tuple containing the open market value, high market value, and close market value.
+        callable: Maps a profile to the lowest age of its band, e.g. 30 for 34.
     """
-    open_market_value = sum(company.open * company.weight for company in companies) / total_weight
-    high_market_value = sum(company.high * company.weight for company in companies) / total_weight
-    close_market_value = sum(company.close * company.weight for company in companies) / total_weight
-    return open_market_value, high_market_value, close_market_value
+    def key(record):
+        return record.age // width * width
+    key.__name__ = f'age_band_{width}'
+    return key
+
+
+def _group_keys(by):
+    """
+    Normalise a ``by`` argument to a dict of grouping name to key spec.
+    """
+    if isinstance(by, str):
+        return {by: by}
+    if isinstance(by, dict):
+        return dict(by)
+    return {spec: spec for spec in by}
+
+
+class GroupByStats:
+    """
+    Single-pass, mergeable group-by aggregation over profiles.
+
+    Several groupings are computed together: for every profile, each
+    grouping's key is computed and the running count, sums, minimums and
+    maximums of that key's group are updated, so per blood group mean
+    ages, coordinate centroids and age band breakdowns all come out of one
+    pass. Sums are kept in the profiles' own numeric type, so ``Decimal``
+    coordinates are summed exactly.
+
+    A grouping key is either a field name, a tuple of field names for a
+    composite key, or a callable taking a ``person_profile`` such as
+    ``age_band(10)``.
+    """
+
+    def __init__(self, by, fields=('age', 'lat', 'long'), aggregates=GROUP_AGGREGATES):
+        """
+        Args:
+            by (str | iterable | dict): Field name, iterable of field names, or dict
+                mapping each grouping's name to its key.
+            fields (sequence): Numeric profile fields to aggregate.
+            aggregates (sequence): Aggregates to report, a subset of ``GROUP_AGGREGATES``.
+        """
+        unknown = set(aggregates) - set(GROUP_AGGREGATES)
+        if unknown:
+            raise ValueError(f'Unknown aggregates {sorted(unknown)}, expected some of {GROUP_AGGREGATES}')
+        self.by = _group_keys(by)
+        self.fields = tuple(fields)
+        self.aggregates = tuple(aggregates)
+        self._field_indices = tuple(_PROFILE_FIELD_INDEX[field] for field in self.fields)
+        self._extremes = 'min' in self.aggregates or 'max' in self.aggregates
+        self._key_functions = []
+        for spec in self.by.values():
+            if callable(spec):
+                self._key_functions.append(spec)
+            elif isinstance(spec, str):
+                self._key_functions.append(operator.itemgetter(_PROFILE_FIELD_INDEX[spec]))
+            else:
+                indices = [_PROFILE_FIELD_INDEX[field] for field in spec]
+                self._key_functions.append(lambda profile, indices=indices: tuple(profile[i] for i in indices))
+        # Per grouping, group key mapped to [count, sums, minimums, maximums]
+        self.groups = {name: {} for name in self.by}
+
+    def add(self, profile):
+        """
+        Add a single profile to every grouping.
+
+        Args:
+            profile (person_profile): The profile.
+        """
+        values = [profile[index] for index in self._field_indices]
+        extremes = self._extremes
+        for key_function, groups in zip(self._key_functions, self.groups.values()):
+            key = key_function(profile)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [1, list(values), list(values), list(values)]
+                continue
+            group[0] += 1
+            sums, minimums, maximums = group[1], group[2], group[3]
+            for position, value in enumerate(values):
+                sums[position] += value
+                if extremes:
+                    if value < minimums[position]:
+                        minimums[position] = value
+                    elif value > maximums[position]:
+                        maximums[position] = value
+
+    def update(self, profiles):
+        """
+        Consume profiles from any iterable without storing them.
+
+        Args:
+            profiles (iterable): ``person_profile`` namedtuples or profile dictionaries.
+
+        Returns:
+            GroupByStats: ``self``, to allow chaining.
+        """
+        for profile in profiles:
+            self.add(person_profile(**profile) if isinstance(profile, dict) else profile)
+        return self
+
+    def merge(self, other):
+        """
+        Fold the groups of another accumulator into this one.
+
+        Args:
+            other (GroupByStats): Partial groups with the same groupings and fields, e.g. from another shard.
+
+        Returns:
+            GroupByStats: ``self``, to allow chaining.
+        """
+        if other.by.keys() != self.by.keys() or other.fields != self.fields:
+            raise ValueError('Cannot merge group-by statistics with different groupings or fields')
+        for name, groups in self.groups.items():
+            for key, (count, sums, minimums, maximums) in other.groups[name].items():
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = [count, list(sums), list(minimums), list(maximums)]
+                    continue
+                group[0] += count
+                group[1] = [total + value for total, value in zip(group[1], sums)]
+                group[2] = [min(pair) for pair in zip(group[2], minimums)]
+                group[3] = [max(pair) for pair in zip(group[3], maximums)]
+        return self
+
+    def result(self):
+        """
+        Compute the requested aggregates of every group.
+
+        Returns:
+            dict: Grouping name mapped to a dict of group key to that group's
+            aggregates, named like ``count``, ``mean_age`` or ``max_lat``.
+        """
+        result = {}
+        for name, groups in self.groups.items():
+            result[name] = {}
+            for key, (count, sums, minimums, maximums) in groups.items():
+                row = {'count': count} if 'count' in self.aggregates else {}
+                for position, field in enumerate(self.fields):
+                    if 'sum' in self.aggregates:
+                        row[f'sum_{field}'] = sums[position]
+                    if 'mean' in self.aggregates:
+                        row[f'mean_{field}'] = sums[position] / count
+                    if 'min' in self.aggregates:
+                        row[f'min_{field}'] = minimums[position]
+                    if 'max' in self.aggregates:
+                        row[f'max_{field}'] = maximums[position]
+                result[name][key] = row
+        return result
+
+
+def group_profiles(profiles, by, fields=('age', 'lat', 'long'), aggregates=GROUP_AGGREGATES):
+    """
+    Aggregate profile fields per group for several groupings in one pass.
+
+    ``ProfileColumns`` take the vectorized ``columnar_group_by`` path, any
+    other iterable of profiles is consumed once by ``GroupByStats``.
+
+    Args:
+        profiles (iterable | ProfileColumns): The profiles.
+        by (str | iterable | dict): Groupings, as for ``GroupByStats``.
+        fields (sequence): Numeric profile fields to aggregate.
+        aggregates (sequence): Aggregates to report, a subset of ``GROUP_AGGREGATES``.
+
+    Returns:
+        dict: Grouping name mapped to a dict of group key to that group's aggregates.
+    """
+    if isinstance(profiles, ProfileColumns):
+        return columnar_group_by(profiles, by, fields, aggregates)
+    return GroupByStats(by, fields, aggregates).update(profiles).result()
+
+
+# Number of profiles generated per shard by the sharded generator
+PROFILE_SHARD_SIZE = 100000
+
+# Process-local Faker instance reused by the shard workers of a process pool
+_shard_fake = None
+
+
+def _profile_shard_stats(seed, shard_index, num_people, backend='decimal', quantiles=False, counter_start=None,
+                         instance=None):
+    """
+    Generate one shard of profiles and reduce it to partial statistics.
+
+    The shard's Faker instance is seeded from ``seed`` and ``shard_index``
+    only, so the shard's profiles do not depend on which process runs it.
+    With ``counter_start`` the shard is instead the slice of the
+    counter-based stream of ``seed`` starting at that index.
+
+    Args:
+        seed (int): Seed of the whole run.
+        shard_index (int): Position of the shard in the run.
+        num_people (int): Number of profiles in this shard.
+        backend (str): Numeric backend, one of ``NUMERIC_BACKENDS``.
+        quantiles (bool): Whether to keep quantile sketches.
+        counter_start (int, optional): Index of the shard's first profile in ``profiles_range``.
+        instance (Faker, optional): Faker instance to reseed for the shard. Only
+            pool workers, which run one shard at a time, share the process-local one.
+
+    Returns:
+        ProfileStats: Statistics of the shard.
+    """
+    global _shard_fake
+    if counter_start is not None:
+        stats = ProfileStats(backend, quantiles, seed=f'{seed}:{shard_index}')
+        return stats.update(profiles_range(seed, counter_start, counter_start + num_people, backend))
+    if instance is None:
+        if _shard_fake is None:
+            _shard_fake = make_fake()
+        instance = _shard_fake
+    instance.seed_instance(f'{seed}:{shard_index}')
+
+    stats = ProfileStats(backend, quantiles, seed=f'{seed}:{shard_index}')
+    return stats.update(draw_profiles(instance, num_people, backend))
+
+
+def generate_profile_stats_sharded(num_people: int, workers: int = 1, seed=None, backend: str = 'decimal',
+                                   shard_size: int = PROFILE_SHARD_SIZE, quantiles: bool = False,
+                                   counter: bool = False):
+    """
+    Generate profile statistics in fixed-size shards across a process pool.
+
+    ``num_people`` is split into shards of ``shard_size`` profiles, each
+    generated with its own seeded Faker instance. Workers send back only a
+    ``ProfileStats`` per shard, which are merged in the parent. Since the
+    shard layout does not depend on ``workers``, the result for a given
+    ``seed`` is the same for any number of workers.
+
+    With ``counter`` the profiles are ``profiles_range(seed, 0, num_people)``
+    instead, so every profile of the run can later be regenerated on its
+    own with ``profile_at``; the statistics then do not depend on
+    ``shard_size`` either.
+
+    Args:
+        num_people (int): The number of fake profiles to generate.
+        workers (int): Number of processes; 1 runs the shards in-process.
+        seed (int, optional): Seed of the run. A random seed is drawn if omitted.
+        backend (str): Numeric backend, one of ``NUMERIC_BACKENDS``.
+        shard_size (int): Number of profiles per shard.
+        quantiles (bool): Whether to keep mergeable quantile sketches.
+        counter (bool): Whether to generate the counter-based stream of ``seed``.
+
+    Returns:
+        ProfileStats: The merged statistics of all shards.
+    """
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    shard_indices = range((num_people + shard_size - 1) // shard_size)
+    shard_sizes = [min(shard_size, num_people - index * shard_size) for index in shard_indices]
+    counter_starts = [index * shard_size if counter else None for index in shard_indices]
+
+    stats = ProfileStats(backend, quantiles, seed=seed)
+    if workers == 1:
+        # A Faker instance of this call only, so that concurrent calls from other threads cannot interleave its draws
+        instance = None if counter else make_fake()
+        for index, size, counter_start in zip(shard_indices, shard_sizes, counter_starts):
+            stats.merge(_profile_shard_stats(seed, index, size, backend, quantiles, counter_start, instance))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for partial in executor.map(_profile_shard_stats, [seed] * len(shard_sizes),
+                                        shard_indices, shard_sizes, [backend] * len(shard_sizes),
+                                        [quantiles] * len(shard_sizes), counter_starts):
+                stats.merge(partial)
+    return stats
+
+
+async def agenerate_profiles(num_people: int, batch_size: int = PROFILE_BATCH_SIZE, seed=None,
+                             backend: str = 'decimal', max_pending: int = 2, stats=None, executor=None):
+    """
+    Generate profiles in batches without blocking the event loop.
+
+    The Faker instance is created, batches are drawn by ``draw_profiles``
+    and ``stats`` are updated in an executor, so the event loop only moves
+    finished batches. Batches are handed over through a queue of at most
+    ``max_pending`` batches, so generation runs ahead of the consumer but
+    stops when the consumer falls behind.
+    Leaving the ``async for`` early or cancelling the consumer stops the
+    producer. For a given seed the profiles are the same as those of
+    ``draw_profiles(make_fake(seed), num_people, backend)``.
+
+    Args:
+        num_people (int): The number of fake profiles to generate.
+        batch_size (int): Number of profiles per batch.
+        seed (int, optional): Seed of the Faker instance used for generation.
+        backend (str): Numeric backend of the coordinates, one of ``NUMERIC_BACKENDS``.
+        max_pending (int): Number of generated batches that may wait for the consumer.
+        stats (ProfileStats, optional): Accumulator updated with every batch
+            before it is yielded, giving the same statistics as the sync path.
+        executor (concurrent.futures.ThreadPoolExecutor, optional): Where batches
+            are drawn; the loop's default thread pool if omitted. The generator
+            and ``stats`` live in the executor's threads, so process pools are
+            rejected with ``TypeError``.
+
+    Yields:
+        tuple: Batches of ``person_profile`` records.
+    """
+    import asyncio
+
+    if executor is not None:
+        from concurrent.futures import ProcessPoolExecutor
+
+        if isinstance(executor, ProcessPoolExecutor):
+            raise TypeError('agenerate_profiles needs a thread executor, the profile generator cannot be '
+                            'sent to other processes')
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_pending)
+    done = object()
+
+    async def produce():
+        try:
+            # Building the Faker instance imports Faker on first use, keep it off the loop too
+            profiles = await loop.run_in_executor(executor, lambda: draw_profiles(make_fake(seed), num_people,
+                                                                                  backend))
+            while True:
+                batch = await loop.run_in_executor(executor, tuple, islice(profiles, batch_size))
+                if not batch:
+                    break
+                await queue.put(batch)
+        except Exception as error:
+            await queue.put(error)
+        await queue.put(done)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is done:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            if stats is not None:
+                await loop.run_in_executor(executor, stats.update, batch)
+            yield batch
+    finally:
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+def benchmark_numeric_backends(num_people: int = 1000000, seed: int = 0, workers: int = 1):
+    """
+    Time sharded profile statistics with every numeric backend.
+
+    All backends draw the same profiles for a given seed, so their means
+    rounded to Faker's six decimals are expected to agree.
+
+    Args:
+        num_people (int): Number of profiles per backend. Default is 1,000,000.
+        seed (int): Seed shared by all backends.
+        workers (int): Number of processes per run.
+
+    Returns:
+        dict: Backend name mapped to a ``(seconds, ProfileSummary)`` tuple.
+    """
+    results = {}
+    for backend in NUMERIC_BACKENDS:
+        start = perf_counter()
+        summary = generate_profile_stats_sharded(num_people, workers, seed, backend).summary()
+        results[backend] = (perf_counter() - start, summary)
+    return results
+
+
+def print_profile_stats(summary: ProfileSummary):
+    """
+    Print profile statistics in the same format as the profile generators.
+
+    Args:
+        summary (ProfileSummary): The statistics to print.
+    """
+    print(f'Largest blood type = {summary.largest_blood_type}')
+    print(f'Mean latitude = {summary.mean_lat}')
+    print(f'Mean longitude = {summary.mean_long}')
+    print(f'Largest age = {summary.largest_age}')
+    print(f'Mean age = {summary.mean_age}')
+    print(summary.blood_group_dict)
+
+
+# Code flag of coroutine functions, as inspect.CO_COROUTINE (inspect is slow to import)
+_CO_COROUTINE = 0x80
+
+
+def _is_coroutine_function(fn):
+    """
+    Tell whether ``fn`` was defined with ``async def``.
+    """
+    code = getattr(fn, '__code__', None)
+    return code is not None and bool(code.co_flags & _CO_COROUTINE)
+
+
+# Modes supported by time_the_fun
+TIMING_MODES = ('print', 'record', 'off')
+
+# Histogram buckets per power of two, durations are kept to about 6% precision
+_TIMING_SUB_BUCKET_BITS = 4
+
+# Enough buckets for any duration that fits in 64 bits of nanoseconds
+_TIMING_BUCKETS = (64 - _TIMING_SUB_BUCKET_BITS + 1) << _TIMING_SUB_BUCKET_BITS
+
+# Raw durations buffered by a 'record' wrapper before they are bucketed
+TIMING_BUFFER_SIZE = 1024
+
+
+class TimingStats:
+    """
+    Bounded-memory histogram of call durations in nanoseconds.
+
+    Durations are counted in log-linear buckets: 16 buckets per power of
+    two, so percentiles are accurate to about 6% while memory stays fixed
+    no matter how many calls are recorded. Count, total and maximum are
+    exact.
+
+    The hot path only appends to ``pending``, which is bucketed in bulk
+    once it holds ``TIMING_BUFFER_SIZE`` durations or a summary is asked for.
+    """
+
+    __slots__ = ('count', 'total_ns', 'max_ns', 'buckets', 'pending')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * _TIMING_BUCKETS
+        self.pending = []
+
+    def record(self, duration_ns):
+        """
+        Add one duration to the histogram.
+
+        Args:
+            duration_ns (int): Duration of a call in nanoseconds.
+        """
+        shift = duration_ns.bit_length() - _TIMING_SUB_BUCKET_BITS - 1
+        if shift < 0:
+            shift = 0
+        self.buckets[(shift << _TIMING_SUB_BUCKET_BITS) + (duration_ns >> shift)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def flush(self):
+        """
+        Move the buffered durations into the histogram.
+        """
+        pending = self.pending
+        if not pending:
+            return
+        self.pending = []
+
+        buckets = self.buckets
+        for duration_ns in pending:
+            shift = duration_ns.bit_length() - _TIMING_SUB_BUCKET_BITS - 1
+            if shift < 0:
+                shift = 0
+            buckets[(shift << _TIMING_SUB_BUCKET_BITS) + (duration_ns >> shift)] += 1
+        self.count += len(pending)
+        self.total_ns += sum(pending)
+        self.max_ns = max(self.max_ns, max(pending))
+
+    def percentile(self, q):
+        """
+        Estimate a percentile of the recorded durations.
+
+        Args:
+            q (float): Percentile between 0 and 100.
+
+        Returns:
+            int: Upper bound of the bucket holding the percentile, in nanoseconds.
+        """
+        self.flush()
+        if self.count == 0:
+            return 0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                shift = max(0, (index >> _TIMING_SUB_BUCKET_BITS) - 1)
+                upper = (((index - (shift << _TIMING_SUB_BUCKET_BITS)) + 1) << shift) - 1
+                return min(upper, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        """
+        Summarize the recorded durations.
+
+        Returns:
+            dict: count, mean, p50, p95, p99 and max, durations in nanoseconds.
+        """
+        self.flush()
+        return {
+            'count': self.count,
+            'mean_ns': self.total_ns / self.count if self.count else 0,
+            'p50_ns': self.percentile(50),
+            'p95_ns': self.percentile(95),
+            'p99_ns': self.percentile(99),
+            'max_ns': self.max_ns,
+        }
+
+
+# Registry of TimingStats for every function decorated in 'record' mode
+timing_registry = {}
+
+
+def timing_report(name=None):
+    """
+    Summarize the timings recorded by ``time_the_fun`` in 'record' mode.
+
+    Args:
+        name (str, optional): Qualified name of a single function to report.
+
+    Returns:
+        dict: Function name mapped to its ``TimingStats.summary()``.
+    """
+    if name is not None:
+        return {name: timing_registry[name].summary()}
+    return {fn_name: stats.summary() for fn_name, stats in timing_registry.items()}
+
+
+def print_timing_report():
+    """
+    Print the recorded timings, one line per function.
+    """
+    for fn_name, summary in timing_report().items():
+        print(f"{fn_name}: count={summary['count']} p50={summary['p50_ns']}ns p95={summary['p95_ns']}ns "
+              f"p99={summary['p99_ns']}ns max={summary['max_ns']}ns")
+
+
+_timing_report_registered = False
+
+
+def report_timings_at_exit():
+    """
+    Print the timing report when the interpreter exits. Safe to call repeatedly.
+    """
+    global _timing_report_registered
+    if not _timing_report_registered:
+        atexit.register(print_timing_report)
+        _timing_report_registered = True
+
+
+class ProfileSamples:
+    """
+    cProfile statistics aggregated over the sampled calls of one function.
+    """
+
+    __slots__ = ('samples', 'stats')
+
+    def __init__(self):
+        self.samples = 0
+        self.stats = None
+
+    def add(self, profiler):
+        """
+        Fold the statistics of one profiled call in.
+
+        Args:
+            profiler (cProfile.Profile): Profiler that ran the call.
+        """
+        import pstats
+
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler)
+        else:
+            self.stats.add(profiler)
+        self.samples += 1
+
+    def hot_functions(self, limit=10):
+        """
+        List the functions with the most time spent in their own code.
+
+        Args:
+            limit (int): Number of functions to return.
+
+        Returns:
+            list: Dicts with the function, its call count, own time and
+            cumulative time in seconds over all samples, hottest first.
+        """
+        if self.stats is None:
+            return []
+        rows = sorted(self.stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [{'function': f'{filename}:{line}({function})', 'calls': calls, 'own_seconds': own,
+                 'cumulative_seconds': cumulative}
+                for (filename, line, function), (_, calls, own, cumulative, _) in rows]
+
+    def dump(self, path):
+        """
+        Write the aggregated statistics in ``pstats`` format, e.g. for snakeviz.
+        """
+        if self.stats is not None:
+            self.stats.dump_stats(path)
+
+
+# Registry of ProfileSamples for every function decorated with profile_every
+profile_registry = {}
+
+# Set while a sampled call runs, so nested sampled calls do not replace its profiler
+_profiling_active = False
+
+
+def profile_report(name=None, limit=10):
+    """
+    Summarize the calls sampled by ``time_the_fun(profile_every=...)``.
+
+    Args:
+        name (str, optional): Qualified name of a single function to report.
+        limit (int): Number of hot functions per decorated function.
+
+    Returns:
+        dict: Function name mapped to its sample count and ``hot_functions``.
+    """
+    names = [name] if name is not None else list(profile_registry)
+    return {fn_name: {'samples': profile_registry[fn_name].samples,
+                      'hot_functions': profile_registry[fn_name].hot_functions(limit)}
+            for fn_name in names}
+
+
+def _enable_profiler(profiler):
+    """
+    Enable ``profiler`` unless another profiler is active, and return whether it was enabled.
+
+    Before Python 3.12 enabling a profiler silently replaces the profile
+    function of the thread, so an active one is detected up front.
+    """
+    import threading
+
+    if sys.getprofile() is not None or threading.getprofile() is not None:
+        return False
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: another tool holds the profiler slot of sys.monitoring
+        return False
+    return True
+
+
+@types.coroutine
+def _profile_steps(coro, profiler):
+    """
+    Drive ``coro`` with ``profiler`` enabled only while it runs, not while it awaits.
+
+    Steps starting while another profiler is active run unprofiled.
+    """
+    resume, value = coro.send, None
+    while True:
+        enabled = _enable_profiler(profiler)
+        try:
+            request = resume(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            if enabled:
+                profiler.disable()
+        try:
+            resume, value = coro.send, (yield request)
+        except BaseException as error:
+            resume, value = coro.throw, error
+
+
+def _sample_profiles(fn, inner, every, output):
+    """
+    Wrap ``inner`` so that one call in ``every`` runs under cProfile.
+
+    Unsampled calls only pay for a countdown. Sampled calls are skipped,
+    i.e. run unprofiled, while another sampled call or profiling tool is
+    active, since cProfile cannot nest. A sampled coroutine is profiled
+    only while its own steps run, so the other tasks that run while it
+    awaits are not attributed to it.
+    """
+    name = f'{fn.__module__}.{fn.__qualname__}'
+    samples = profile_registry.setdefault(name, ProfileSamples())
+    countdown = every
+
+    def begin():
+        global _profiling_active
+        if _profiling_active:
+            return None
+        import cProfile
+
+        profiler = cProfile.Profile()
+        if not _enable_profiler(profiler):
+            return None
+        _profiling_active = True
+        return profiler
+
+    def end(profiler):
+        global _profiling_active
+        profiler.disable()
+        _profiling_active = False
+        samples.add(profiler)
+        if callable(output):
+            output(name, samples.stats)
+        elif output is not None:
+            samples.dump(output.format(name=name))
+
+    if _is_coroutine_function(fn):
+        @functools.wraps(fn)
+        async def sampled(*args, **kwargs):
+            nonlocal countdown
+            countdown -= 1
+            if countdown:
+                return await inner(*args, **kwargs)
+            countdown = every
+            profiler = begin()
+            if profiler is None:
+                return await inner(*args, **kwargs)
+            # From here on only the call's own steps are profiled
+            profiler.disable()
+            try:
+                return await _profile_steps(inner(*args, **kwargs), profiler)
+            finally:
+                end(profiler)
+    else:
+        @functools.wraps(fn)
+        def sampled(*args, **kwargs):
+            nonlocal countdown
+            countdown -= 1
+            if countdown:
+                return inner(*args, **kwargs)
+            countdown = every
+            profiler = begin()
+            if profiler is None:
+                return inner(*args, **kwargs)
+            try:
+                return inner(*args, **kwargs)
+            finally:
+                end(profiler)
+    return sampled
+
+
+def time_the_fun(fn=None, *, mode='print', profile_every=None, profile_output=None):
+    """
+    Decorator function to measure the execution time of a function.
+
+    Can be used bare (``@time_the_fun``) or with a mode
+    (``@time_the_fun(mode='record')``). 'print' prints the time of every
+    call, 'record' adds ``perf_counter_ns`` durations to the function's
+    ``TimingStats`` in ``timing_registry`` without printing, and 'off'
+    returns the function undecorated. Coroutine functions are timed until
+    their result is awaited.
+
+    With ``profile_every=N``, one call in N also runs under cProfile and
+    its statistics are aggregated in the function's ``ProfileSamples`` in
+    ``profile_registry`` (see ``profile_report``). The other calls only pay
+    for a countdown, so sampling can stay enabled in production. Samples
+    are skipped while another profiler is active, and a sampled coroutine
+    is only profiled while its own steps run, not across its awaits.
+
+    Args:
+        fn (callable): The function to be timed.
+        mode (str): One of ``TIMING_MODES``.
+        profile_every (int, optional): Profile one call in this many.
+        profile_output (str | callable, optional): After every sample, the aggregated
+            ``pstats.Stats`` are dumped to this path (``{name}`` is replaced by the
+            function's qualified name), or passed to this callable with the name.
+
+    Returns:
+        callable: The decorated function that measures the execution time.
+    """
+    if mode not in TIMING_MODES:
+        raise ValueError(f'Unknown timing mode {mode!r}, expected one of {TIMING_MODES}')
+    if profile_every is not None and profile_every < 1:
+        raise ValueError('profile_every must be at least 1')
+    if fn is None:
+        return functools.partial(time_the_fun, mode=mode, profile_every=profile_every,
+                                 profile_output=profile_output)
+    if profile_every is not None:
+        inner = time_the_fun(fn, mode=mode)
+        return _sample_profiles(fn, inner, profile_every, profile_output)
+    if mode == 'off':
+        return fn
+
+    if mode == 'record':
+        stats = timing_registry.setdefault(f'{fn.__module__}.{fn.__qualname__}', TimingStats())
+
+        if _is_coroutine_function(fn):
+            @functools.wraps(fn)
+            async def inner(*args, **kwargs):
+                start = perf_counter_ns()
+                return_fn = await fn(*args, **kwargs)
+                stats.pending.append(perf_counter_ns() - start)
+                if len(stats.pending) >= TIMING_BUFFER_SIZE:
+                    stats.flush()
+                return return_fn
+        else:
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                start = perf_counter_ns()
+                return_fn = fn(*args, **kwargs)
+                stats.pending.append(perf_counter_ns() - start)
+                if len(stats.pending) >= TIMING_BUFFER_SIZE:
+                    stats.flush()
+                return return_fn
+        return inner
+
+    if _is_coroutine_function(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            start = perf_counter()
+            return_fn = await fn(*args, **kwargs)
+            stop = perf_counter()
+            print(f'Time taken to execute {fn.__name__} is {stop-start}')
+            return return_fn
+    else:
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            start = perf_counter()
+            return_fn = fn(*args, **kwargs)
+            stop = perf_counter()
+            print(f'Time taken to execute {fn.__name__} is {stop-start}')
+            return return_fn
+    return inner
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of the process in bytes.
+
+    Returns:
+        int | None: The peak RSS, None where ``resource`` is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux and the BSDs kilobytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _current_rss():
+    """
+    Return the resident set size of the process in bytes.
+
+    Read from ``/proc/self/statm`` where available, otherwise the peak RSS
+    reported by ``getrusage`` is used.
+    """
+    import os
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss_bytes() or 0
+
+
+class MemoryStats:
+    """
+    Memory used by the calls of one function.
+
+    Peaks are traced allocations above the allocations live when the call
+    started, as reported by tracemalloc; RSS deltas are the change of the
+    process's resident set size over the call, which also covers memory
+    allocated outside of Python's allocator (e.g. NumPy buffers on some
+    builds) but is not reliable for short calls.
+
+    tracemalloc keeps a single peak for the whole process, so a call that
+    overlapped a tracked call of another task or thread cannot be told
+    apart from it. Such calls are only counted in ``concurrent``.
+    """
+
+    __slots__ = ('count', 'total_peak_bytes', 'max_peak_bytes', 'max_rss_delta_bytes', 'exceeded',
+                 'fallback_active', 'concurrent')
+
+    def __init__(self):
+        self.count = 0
+        self.total_peak_bytes = 0
+        self.max_peak_bytes = 0
+        self.max_rss_delta_bytes = 0
+        self.exceeded = 0
+        self.fallback_active = False
+        self.concurrent = 0
+
+    def record(self, peak_bytes, rss_delta_bytes, concurrent=False):
+        """
+        Add the measurements of one call.
+
+        Args:
+            peak_bytes (int): Peak traced allocation of the call.
+            rss_delta_bytes (int): Change of the resident set size over the call.
+            concurrent (bool): Whether the call overlapped another task's or thread's
+                tracked call, in which case the measurements are not its own and are dropped.
+        """
+        if concurrent:
+            self.concurrent += 1
+            return
+        self.count += 1
+        self.total_peak_bytes += peak_bytes
+        if peak_bytes > self.max_peak_bytes:
+            self.max_peak_bytes = peak_bytes
+        if rss_delta_bytes > self.max_rss_delta_bytes:
+            self.max_rss_delta_bytes = rss_delta_bytes
+
+    def summary(self):
+        """
+        Summarize the recorded calls.
+
+        Returns:
+            dict: count, mean and max peak, max RSS delta in bytes, budget overruns,
+            whether the fallback is active and the number of unmeasured concurrent calls.
+        """
+        return {
+            'count': self.count,
+            'mean_peak_bytes': self.total_peak_bytes / self.count if self.count else 0,
+            'max_peak_bytes': self.max_peak_bytes,
+            'max_rss_delta_bytes': self.max_rss_delta_bytes,
+            'exceeded': self.exceeded,
+            'fallback_active': self.fallback_active,
+            'concurrent': self.concurrent,
+        }
+
+
+# Registry of MemoryStats for every function decorated with track_memory
+memory_registry = {}
+
+
+class _MemoryFrame:
+    """
+    A track_memory call in progress: traced bytes at its start, highest traced
+    bytes seen since, and whether another task's or thread's call overlapped it.
+    """
+
+    __slots__ = ('start', 'peak', 'concurrent')
+
+    def __init__(self, start):
+        self.start = start
+        self.peak = start
+        self.concurrent = False
+
+
+# Every track_memory call in progress, in any task or thread
+_active_memory_frames = []
+
+# The track_memory calls enclosing the current task's or thread's code, innermost last
+_memory_context = contextvars.ContextVar('_memory_context', default=())
+
+# Whether a track_memory call started tracemalloc, so the last one to end has to stop it
+_memory_trace_started = False
+
+
+def memory_report(name=None):
+    """
+    Summarize the memory recorded by ``track_memory``.
+
+    Args:
+        name (str, optional): Qualified name of a single function to report.
+
+    Returns:
+        dict: Function name mapped to its ``MemoryStats.summary()``.
+    """
+    if name is not None:
+        return {name: memory_registry[name].summary()}
+    return {fn_name: stats.summary() for fn_name, stats in memory_registry.items()}
+
+
+def _begin_memory_trace():
+    """
+    Start measuring a call.
+
+    Returns:
+        tuple: The call's ``_MemoryFrame``, the token restoring the enclosing
+        context, and the resident bytes the call starts from.
+    """
+    global _memory_trace_started
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _memory_trace_started = True
+    current, peak = tracemalloc.get_traced_memory()
+    enclosing = _memory_context.get()
+    frame = _MemoryFrame(current)
+    for other in _active_memory_frames:
+        # reset_peak below would lose the peak of the calls in progress so far
+        other.peak = max(other.peak, peak)
+        if not any(other is outer for outer in enclosing):
+            other.concurrent = frame.concurrent = True
+    tracemalloc.reset_peak()
+    _active_memory_frames.append(frame)
+    return frame, _memory_context.set(enclosing + (frame,)), _current_rss()
+
+
+def _end_memory_trace(frame, token):
+    """
+    Stop measuring a call.
+
+    Returns:
+        tuple: The call's peak traced allocation in bytes and whether it overlapped another call.
+    """
+    global _memory_trace_started
+    import tracemalloc
+
+    peak = tracemalloc.get_traced_memory()[1]
+    for other in _active_memory_frames:
+        other.peak = max(other.peak, peak)
+    _active_memory_frames.remove(frame)
+    _memory_context.reset(token)
+    if not _active_memory_frames and _memory_trace_started:
+        tracemalloc.stop()
+        _memory_trace_started = False
+    return frame.peak - frame.start, frame.concurrent
+
+
+def track_memory(fn=None, *, budget=None, fallback=None):
+    """
+    Decorator recording the peak traced allocation and RSS delta of every call.
+
+    Companion of ``time_the_fun``: measurements go to the function's
+    ``MemoryStats`` in ``memory_registry`` (see ``memory_report``). Calls
+    are traced with tracemalloc, which slows allocation down, and nested
+    tracked calls are accounted to their callers too. Calls overlapping a
+    tracked call of another task or thread share tracemalloc's single peak
+    with it, so they are only counted in ``MemoryStats.concurrent`` and
+    are not checked against the budget.
+
+    With a ``budget``, a call whose peak exceeds it raises ``MemoryError``
+    after it returns, or, when ``fallback`` keyword arguments are given
+    (e.g. ``{'stream': True}``), its result is kept and every later call
+    is made with those arguments, switching the function to its streaming
+    path.
+
+    Args:
+        fn (callable): The function to be measured.
+        budget (int, optional): Largest allowed peak traced allocation in bytes.
+        fallback (dict, optional): Keyword arguments used once the budget was exceeded.
+
+    Returns:
+        callable: The decorated function.
+    """
+    if fn is None:
+        return functools.partial(track_memory, budget=budget, fallback=fallback)
+
+    name = f'{fn.__module__}.{fn.__qualname__}'
+    stats = memory_registry.setdefault(name, MemoryStats())
+
+    def check(peak_bytes):
+        if budget is None or peak_bytes <= budget:
+            return
+        stats.exceeded += 1
+        if fallback is None:
+            raise MemoryError(f'{name} allocated {peak_bytes} bytes, over its budget of {budget} bytes')
+        stats.fallback_active = True
+
+    def arguments(kwargs):
+        return {**kwargs, **fallback} if stats.fallback_active else kwargs
+
+    if _is_coroutine_function(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            frame, token, start_rss = _begin_memory_trace()
+            try:
+                return_fn = await fn(*args, **arguments(kwargs))
+            finally:
+                peak_bytes, concurrent = _end_memory_trace(frame, token)
+                stats.record(peak_bytes, _current_rss() - start_rss, concurrent)
+            if not concurrent:
+                check(peak_bytes)
+            return return_fn
+    else:
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            frame, token, start_rss = _begin_memory_trace()
+            try:
+                return_fn = fn(*args, **arguments(kwargs))
+            finally:
+                peak_bytes, concurrent = _end_memory_trace(frame, token)
+                stats.record(peak_bytes, _current_rss() - start_rss, concurrent)
+            if not concurrent:
+                check(peak_bytes)
+            return return_fn
+    return inner
+
+
+@time_the_fun
+def generate_fake_profiles_and_stats_tuple(num_people: int, stream: bool = False, workers: int = None,
+                                           seed=None, backend: str = 'decimal'):
+    """
+    Generate fake profiles and compute statistics.
+
+    This function generates a specified number of fake profiles,
+    calculates the mean latitude, mean longitude, mean age, largest
+    age, and counts the occurrences of each blood type.
+
+    Args:
+        num_people (int): The number of fake profiles to generate.
+        stream (bool): If True, profiles are fed from a generator straight
+            into a ``ProfileStats`` accumulator and never stored, and the
+            ``ProfileSummary`` is returned instead of the profiles.
+        workers (int, optional): If given, profiles are generated by
+            ``generate_profile_stats_sharded`` on this many processes and
+            the ``ProfileSummary`` is returned.
+        seed (int, optional): Seed for the sharded generation, the result
+            is reproducible for any number of workers.
+        backend (str): Numeric backend of the streaming and sharded modes,
+            one of ``NUMERIC_BACKENDS``.
+
+    Prints:
+        - Largest blood type by count
+        - Mean latitude
+        - Mean longitude
+        - Largest age
+        - Mean age
+        - Count of each blood type
+    """
+    if workers is not None:
+        summary = generate_profile_stats_sharded(num_people, workers, seed, backend).summary()
+        print_profile_stats(summary)
+        return summary
+
+    fake = get_fake()
+    if stream:
+        summary = ProfileStats(backend).update(draw_profiles(fake, num_people, backend)).summary()
+        print_profile_stats(summary)
+        return summary
+
+    # Generate fake profiles, ages and blood groups are drawn in bulk
+    profiles = tuple(draw_profiles(fake, num_people))
+
+    # Initialize accumulators for statistics
+    sum_lat = Decimal('0')
+    sum_long = Decimal('0')
+    sum_age = 0
+    largest_age = 0
+    blood_group_dict = {'A+': 0, 'A-': 0, 'B+': 0, 'B-': 0, 'AB+': 0, 'AB-': 0, 'O+': 0, 'O-': 0}
+
+    # Calculate statistics from profiles
+    for profile in profiles:
+        sum_lat += profile.lat
+        sum_long += profile.long
+        sum_age += profile.age
+        if profile.age > largest_age:
+            largest_age = profile.age
+        blood_group_dict[profile.blood_type] += 1
+
+    # Calculate means
+    mean_lat = sum_lat / len(profiles)
+    mean_long = sum_long / len(profiles)
+    mean_age = sum_age / len(profiles)
+
+    # Print statistics
+    print(f'Largest blood type = {sorted(blood_group_dict.items(), key=lambda item: item[1], reverse=True)[0][0]}')
+    print(f'Mean latitude = {mean_lat}')
+    print(f'Mean longitude = {mean_long}')
+    print(f'Largest age = {largest_age}')
+    print(f'Mean age = {mean_age}')
+    print(blood_group_dict)
+
+    return profiles
+
+
+@time_the_fun
+def generate_fake_profiles_and_stats_dict(num_people: int, stream: bool = False, workers: int = None,
+                                          seed=None, backend: str = 'decimal'):
+    """
+    Generate fake profiles and compute statistics.
+
+    This function generates a specified number of fake profiles,
+    calculates the mean latitude, mean longitude, mean age, largest
+    age, and counts the occurrences of each blood type.
+
+    Args:
+        num_people (int): The number of fake profiles to generate.
+        stream (bool): If True, profiles are fed from a generator straight
+            into a ``ProfileStats`` accumulator and never stored, and the
+            ``ProfileSummary`` is returned.
+        workers (int, optional): If given, profiles are generated by
+            ``generate_profile_stats_sharded`` on this many processes and
+            the ``ProfileSummary`` is returned.
+        seed (int, optional): Seed for the sharded generation, the result
+            is reproducible for any number of workers.
+        backend (str): Numeric backend of the streaming and sharded modes,
+            one of ``NUMERIC_BACKENDS``.
+
+    Prints:
+        - Largest blood type by count
+        - Mean latitude
+        - Mean longitude
+        - Largest age
+        - Mean age
+        - Count of each blood type
+    """
+    if workers is not None:
+        summary = generate_profile_stats_sharded(num_people, workers, seed, backend).summary()
+        print_profile_stats(summary)
+        return summary
+
+    fake = get_fake()
+    if stream:
+        summary = ProfileStats(backend).update(
+            profile._asdict() for profile in draw_profiles(fake, num_people, backend)
+        ).summary()
+        print_profile_stats(summary)
+        return summary
+
+    # Generate fake profiles as a list of dictionaries, ages and blood groups are drawn in bulk
+    profiles = [{
+        'age': profile.age,
+        'lat': profile.lat,
+        'long': profile.long,
+        'blood_type': profile.blood_type
+    } for profile in draw_profiles(fake, num_people)]
+
+    # Initialize accumulators for statistics
+    sum_lat = Decimal('0')
+    sum_long = Decimal('0')
+    sum_age = 0
+    largest_age = 0
+    blood_group_dict = {'A+': 0, 'A-': 0, 'B+': 0, 'B-': 0, 'AB+': 0, 'AB-': 0, 'O+': 0, 'O-': 0}
+
+    # Calculate statistics from profiles
+    for index in range(len(profiles)):
+        sum_lat += profiles[index]['lat']
+        sum_long += profiles[index]['long']
+        sum_age += profiles[index]['age']
+        if profiles[index]['age'] > largest_age:
+            largest_age = profiles[index]['age']
+        blood_group_dict[profiles[index]['blood_type']] += 1
+
+    # Calculate means
+    mean_lat = sum_lat / len(profiles)
+    mean_long = sum_long / len(profiles)
+    mean_age = sum_age / len(profiles)
+
+    # Print statistics
+    print(f'Largest blood type = {sorted(blood_group_dict.items(), key=lambda item: item[1], reverse=True)[0][0]}')
+    print(f'Mean latitude = {mean_lat}')
+    print(f'Mean longitude = {mean_long}')
+    print(f'Largest age = {largest_age}')
+    print(f'Mean age = {mean_age}')
+    print(blood_group_dict)
+
+
+def generate_profiles_columnar(num_people: int, seed=None):
+    """
+    Generate fake profiles as contiguous NumPy columns.
+
+    Values are drawn with the same distributions as the Faker based
+    generators: ages uniform in 0..99 (``AgeProvider``), blood groups
+    uniform over ``BLOOD_GROUPS`` (``BloodGroupProvider``), longitudes as
+    whole microdegrees in [-180, 180] and latitudes as half of such a
+    draw (``fake.longitude()`` / ``fake.latitude()``).
+
+    Args:
+        num_people (int): The number of profiles to generate.
+        seed (int, optional): Seed for the NumPy random generator.
+
+    Returns:
+        ProfileColumns: int8 ages, float64 latitudes and longitudes and
+        uint8 blood group codes indexing into ``BLOOD_GROUPS``.
+    """
+    np = _require_numpy()
+    rng = np.random.default_rng(seed)
+    age = rng.integers(0, 100, size=num_people, dtype=np.int8)
+    lat = rng.integers(-180000000, 180000001, size=num_people) / 2000000
+    long = rng.integers(-180000000, 180000001, size=num_people) / 1000000
+    blood_type = rng.integers(0, len(BLOOD_GROUPS), size=num_people, dtype=np.uint8)
+    return ProfileColumns(age, lat, long, blood_type)
+
+
+def _splitmix_columns(np, key, counters):
+    """
+    Vectorized ``_splitmix`` over an array of counters.
+    """
+    z = np.uint64(key) + (counters + np.uint64(1)) * np.uint64(_SPLITMIX_GAMMA)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _multiply_shift(np, words, bound):
+    """
+    Vectorized ``(words * bound) >> 64`` for ``bound`` below 2**32, without 128-bit integers.
+    """
+    bound = np.uint64(bound)
+    high = (words >> np.uint64(32)) * bound
+    low = ((words & np.uint64(0xFFFFFFFF)) * bound) >> np.uint64(32)
+    return ((high + low) >> np.uint64(32)).astype(np.int64)
+
+
+def profiles_range_columnar(seed, start, stop):
+    """
+    Generate profiles ``start`` to ``stop - 1`` of the counter-based stream of ``seed`` as columns.
+
+    Computes the same SplitMix64 words as ``profile_at`` with NumPy uint64
+    arithmetic, so the columns hold exactly the profiles of
+    ``profiles_range(seed, start, stop, backend='float')``.
+
+    Args:
+        seed (int | str): Seed of the stream.
+        start (int): Index of the first profile.
+        stop (int): Index after the last profile.
+
+    Returns:
+        ProfileColumns: int8 ages, float64 latitudes and longitudes and
+        uint8 blood group codes indexing into ``BLOOD_GROUPS``.
+    """
+    if start < 0:
+        raise ValueError('start must not be negative')
+    np = _require_numpy()
+    key = _counter_key(seed)
+    counters = np.arange(start, max(start, stop), dtype=np.uint64) * np.uint64(_COUNTER_WORDS)
+    age = _multiply_shift(np, _splitmix_columns(np, key, counters), len(AGES)).astype(np.int8)
+    lat = (_multiply_shift(np, _splitmix_columns(np, key, counters + np.uint64(1)), _COORDINATE_DRAWS)
+           - 180000000) / 2000000
+    long = (_multiply_shift(np, _splitmix_columns(np, key, counters + np.uint64(2)), _COORDINATE_DRAWS)
+            - 180000000) / 1000000
+    blood_type = _multiply_shift(np, _splitmix_columns(np, key, counters + np.uint64(3)),
+                                 len(BLOOD_GROUPS)).astype(np.uint8)
+    return ProfileColumns(age, lat, long, blood_type)
+
+
+def columnar_profile_stats(columns: ProfileColumns):
+    """
+    Compute profile statistics from columnar data with vectorized reductions.
+
+    Args:
+        columns (ProfileColumns): Columns as returned by ``generate_profiles_columnar``.
+
+    Returns:
+        ProfileSummary: Largest blood type, mean latitude, mean longitude,
+        largest age, mean age and the count of each blood type.
+    """
+    if len(columns.age) == 0:
+        raise ValueError('Cannot compute statistics of zero profiles')
+
+    np = _require_numpy()
+    counts = np.bincount(columns.blood_type, minlength=len(BLOOD_GROUPS))
+    blood_group_dict = {group: int(count) for group, count in zip(BLOOD_GROUPS, counts)}
+    return ProfileSummary(
+        largest_blood_type=BLOOD_GROUPS[int(counts.argmax())],
+        mean_lat=float(columns.lat.mean()),
+        mean_long=float(columns.long.mean()),
+        largest_age=int(columns.age.max()),
+        mean_age=float(columns.age.mean(dtype=np.float64)),
+        blood_group_dict=blood_group_dict,
+    )
+
+
+def _factorise(np, key):
+    """
+    Return the distinct values of a key array and each row's code into them.
+
+    Integer keys with a range no larger than the array are offset instead
+    of sorted; unused values then get codes too and drop out as empty groups.
+    """
+    key = np.asarray(key)
+    if key.dtype.kind in 'biu' and len(key):
+        low, high = int(key.min()), int(key.max())
+        if high - low < len(key):
+            return np.arange(low, high + 1), key.astype(np.int64) - low
+    values, codes = np.unique(key, return_inverse=True)
+    return values, codes.reshape(-1)
+
+
+def _column_key(columns, spec):
+    """
+    Return the key array of one grouping spec and a function mapping its values to Python keys.
+    """
+    if callable(spec):
+        return spec(columns), lambda value: value.item()
+    if spec == 'blood_type':
+        return columns.blood_type, lambda value: BLOOD_GROUPS[value]
+    return getattr(columns, spec), lambda value: value.item()
+
+
+def columnar_group_by(columns: ProfileColumns, by, fields=('age', 'lat', 'long'), aggregates=GROUP_AGGREGATES):
+    """
+    Group-by aggregation of columnar profiles with vectorized reductions.
+
+    Each grouping's key parts are factorised into integer codes combined
+    into one group id per row. Counts and sums are then computed with
+    ``bincount`` and minimums and maximums with ``minimum.at``/``maximum.at``,
+    without sorting the rows when the keys are small integers. Results have
+    the same layout as ``GroupByStats.result``, with blood group codes
+    mapped back to their names. Callable keys receive the whole ``ProfileColumns``.
+
+    Args:
+        columns (ProfileColumns): Columns as returned by ``generate_profiles_columnar``.
+        by (str | iterable | dict): Groupings, as for ``GroupByStats``.
+        fields (sequence): Numeric profile fields to aggregate.
+        aggregates (sequence): Aggregates to report, a subset of ``GROUP_AGGREGATES``.
+
+    Returns:
+        dict: Grouping name mapped to a dict of group key to that group's aggregates.
+    """
+    unknown = set(aggregates) - set(GROUP_AGGREGATES)
+    if unknown:
+        raise ValueError(f'Unknown aggregates {sorted(unknown)}, expected some of {GROUP_AGGREGATES}')
+
+    np = _require_numpy()
+    if len(columns.age) == 0:
+        return {name: {} for name in _group_keys(by)}
+    result = {}
+    for name, spec in _group_keys(by).items():
+        specs = (spec,) if callable(spec) or isinstance(spec, str) else tuple(spec)
+        # Mixed-radix combination of the codes of each part of the key
+        parts = []
+        group_ids = 0
+        num_groups = 1
+        for part in specs:
+            key, to_key = _column_key(columns, part)
+            values, codes = _factorise(np, key)
+            parts.append((values, to_key))
+            group_ids = group_ids * len(values) + codes
+            num_groups *= len(values)
+        if num_groups > len(group_ids):
+            group_codes, group_ids = np.unique(group_ids, return_inverse=True)
+            group_ids = group_ids.reshape(-1)
+            num_groups = len(group_codes)
+        else:
+            group_codes = np.arange(num_groups)
+
+        counts = np.bincount(group_ids, minlength=num_groups)
+        present = np.flatnonzero(counts)
+        rows = [{'count': count} if 'count' in aggregates else {} for count in counts[present].tolist()]
+        for field in fields:
+            field_values = np.asarray(getattr(columns, field))
+            integral = field_values.dtype.kind in 'biu'
+            aggregated = {}
+            if 'sum' in aggregates or 'mean' in aggregates:
+                sums = np.bincount(group_ids, weights=field_values, minlength=num_groups)[present]
+                if 'sum' in aggregates:
+                    aggregated[f'sum_{field}'] = sums.astype(np.int64) if integral else sums
+                if 'mean' in aggregates:
+                    aggregated[f'mean_{field}'] = sums / counts[present]
+            for aggregate, reduce, initial in (('min', np.minimum, 'max'), ('max', np.maximum, 'min')):
+                if aggregate in aggregates:
+                    limits = np.iinfo(field_values.dtype) if integral else np.finfo(field_values.dtype)
+                    extremes = np.full(num_groups, getattr(limits, initial), dtype=field_values.dtype)
+                    reduce.at(extremes, group_ids, field_values)
+                    aggregated[f'{aggregate}_{field}'] = extremes[present]
+            for label, column in aggregated.items():
+                for row, value in zip(rows, column.tolist()):
+                    row[label] = value
+
+        group_codes = group_codes[present]
+        digits = []
+        for values, to_key in reversed(parts):
+            digits.append([to_key(value) for value in values[group_codes % len(values)]])
+            group_codes = group_codes // len(values)
+        keys = list(zip(*reversed(digits))) if len(specs) > 1 else digits[0]
+        result[name] = dict(zip(keys, rows))
+    return result
+
+
+class ProfileTable:
+    """
+    Compact array-backed container of profiles.
+
+    Ages and blood group codes are stored one byte each in ``array('B')``
+    and coordinates as doubles in ``array('d')``, 18 bytes per profile
+    instead of a few hundred for a ``person_profile`` holding ``Decimal``s.
+    Indexing and iteration build ``person_profile`` records on demand (with
+    float coordinates), and slicing returns a view sharing the same arrays.
+    """
+
+    __slots__ = ('_age', '_lat', '_long', '_blood_type', '_rows')
+
+    def __init__(self, profiles=()):
+        """
+        Args:
+            profiles (iterable): ``person_profile``-like records to store.
+        """
+        self._age = array('B')
+        self._lat = array('d')
+        self._long = array('d')
+        self._blood_type = array('B')
+        # None when the table owns all rows, otherwise the rows of a view
+        self._rows = None
+        self.extend(profiles)
+
+    def __len__(self):
+        return len(self._age) if self._rows is None else len(self._rows)
+
+    def _row_indices(self):
+        return range(len(self._age)) if self._rows is None else self._rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            view = ProfileTable.__new__(ProfileTable)
+            view._age, view._lat, view._long, view._blood_type = self._age, self._lat, self._long, self._blood_type
+            view._rows = self._row_indices()[index]
+            return view
+
+        row = self._row_indices()[index]
+        return person_profile(self._age[row], self._lat[row], self._long[row], BLOOD_GROUPS[self._blood_type[row]])
+
+    def __iter__(self):
+        if self._rows is None:
+            for age, lat, long, code in zip(self._age, self._lat, self._long, self._blood_type):
+                yield person_profile(age, lat, long, BLOOD_GROUPS[code])
+        else:
+            for row in self._rows:
+                yield person_profile(self._age[row], self._lat[row], self._long[row],
+                                     BLOOD_GROUPS[self._blood_type[row]])
+
+    def __repr__(self):
+        return f'ProfileTable(<{len(self)} profiles>)'
+
+    def append(self, profile):
+        """
+        Append one profile.
+
+        Args:
+            profile (person_profile): Any record with age, lat, long and blood type in that order.
+        """
+        if self._rows is not None:
+            raise TypeError('Cannot append to a ProfileTable slice')
+        age, lat, long, blood_type = profile
+        self._age.append(age)
+        self._lat.append(lat)
+        self._long.append(long)
+        self._blood_type.append(BLOOD_GROUP_CODES[blood_type])
+
+    def extend(self, profiles):
+        """
+        Append every profile of an iterable.
+
+        Args:
+            profiles (iterable): ``person_profile``-like records.
+        """
+        for profile in profiles:
+            self.append(profile)
+
+    def _column(self, column):
+        """
+        Iterate one column over the rows of this table or view.
+        """
+        return column if self._rows is None else map(column.__getitem__, self._rows)
+
+    def mean_lat(self):
+        """
+        Returns:
+            float: Mean latitude, summed with ``math.fsum``.
+        """
+        return math.fsum(self._column(self._lat)) / len(self)
+
+    def mean_long(self):
+        """
+        Returns:
+            float: Mean longitude, summed with ``math.fsum``.
+        """
+        return math.fsum(self._column(self._long)) / len(self)
+
+    def mean_age(self):
+        """
+        Returns:
+            float: Mean age.
+        """
+        return sum(self._column(self._age)) / len(self)
+
+    def largest_age(self):
+        """
+        Returns:
+            int: Largest age.
+        """
+        return max(self._column(self._age))
+
+    def blood_group_dict(self):
+        """
+        Returns:
+            dict: Count of each blood type.
+        """
+        if self._rows is None:
+            return {group: self._blood_type.count(code) for code, group in enumerate(BLOOD_GROUPS)}
+        counts = Counter(self._column(self._blood_type))
+        return {group: counts[code] for code, group in enumerate(BLOOD_GROUPS)}
+
+    def largest_blood_type(self):
+        """
+        Returns:
+            str: The most common blood type.
+        """
+        return sorted(self.blood_group_dict().items(), key=lambda item: item[1], reverse=True)[0][0]
+
+    def summary(self):
+        """
+        Compute all profile statistics of the table.
+
+        Returns:
+            ProfileSummary: Largest blood type, mean latitude, mean longitude,
+            largest age, mean age and the count of each blood type.
+        """
+        if len(self) == 0:
+            raise ValueError('Cannot compute statistics of zero profiles')
+
+        blood_group_dict = self.blood_group_dict()
+        return ProfileSummary(
+            largest_blood_type=sorted(blood_group_dict.items(), key=lambda item: item[1], reverse=True)[0][0],
+            mean_lat=self.mean_lat(),
+            mean_long=self.mean_long(),
+            largest_age=self.largest_age(),
+            mean_age=self.mean_age(),
+            blood_group_dict=blood_group_dict,
+        )
+
+
+# Mean radius of the Earth used for haversine distances, in kilometres
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, long1, lat2, long2):
+    """
+    Great-circle distance between two points given in degrees.
+
+    Returns:
+        float: The distance in kilometres.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(long2 - long1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    Uniform grid index over profile coordinates.
+
+    The globe is cut into ``cell_size`` x ``cell_size`` degree cells and
+    each cell keeps the positions and coordinates of its profiles in
+    ``array``s, about 20 bytes per profile. Queries only visit the cells
+    overlapping the searched area, so with the default 1 degree cells a
+    radius query of a few dozen kilometres over 10M uniformly spread
+    profiles checks a few hundred of them. Results are positions in
+    insertion order, i.e. indices into the indexed collection.
+    """
+
+    def __init__(self, profiles=(), cell_size=1.0, scale=1):
+        """
+        Args:
+            profiles (iterable): ``person_profile``-like records to index.
+            cell_size (float): Side of a grid cell in degrees.
+            scale (int): Units per degree of the coordinates, ``FIXED_POINT_SCALE``
+                for profiles drawn with the 'fixed' backend.
+        """
+        if cell_size <= 0:
+            raise ValueError('cell_size must be positive')
+        self.cell_size = cell_size
+        self.scale = scale
+        self._rows = math.ceil(180 / cell_size)
+        self._columns = math.ceil(360 / cell_size)
+        # Cell key mapped to the (positions, lats, longs) arrays of its profiles
+        self._cells = {}
+        self._count = 0
+        self.extend(profiles)
+
+    @classmethod
+    def from_columns(cls, columns, cell_size=1.0, scale=1):
+        """
+        Build an index over columnar profiles with vectorized bucketing.
+
+        Args:
+            columns (ProfileColumns): Columns as returned by ``generate_profiles_columnar``.
+            cell_size (float): Side of a grid cell in degrees.
+            scale (int): Units per degree of the coordinates.
+
+        Returns:
+            SpatialIndex: The index, positions being row numbers of ``columns``.
+        """
+        np = _require_numpy()
+        index = cls(cell_size=cell_size, scale=scale)
+        lat = np.asarray(columns.lat, dtype=np.float64) / scale
+        long = np.asarray(columns.long, dtype=np.float64) / scale
+        rows = np.clip((lat + 90) // cell_size, 0, index._rows - 1).astype(np.int64)
+        keys = rows * index._columns + np.clip((long + 180) // cell_size, 0, index._columns - 1).astype(np.int64)
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        position_type = np.dtype(f'u{array("L").itemsize}')
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else keys
+        bounds = np.r_[starts, len(keys)]
+        for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            rows = order[start:stop]
+            positions, lats, longs = array('L'), array('d'), array('d')
+            positions.frombytes(rows.astype(position_type).tobytes())
+            lats.frombytes(lat[rows].tobytes())
+            longs.frombytes(long[rows].tobytes())
+            index._cells[int(keys[start])] = (positions, lats, longs)
+        index._count = len(keys)
+        return index
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return f'SpatialIndex(<{self._count} profiles in {len(self._cells)} cells>)'
+
+    def _row(self, lat):
+        return min(max(int((lat + 90) // self.cell_size), 0), self._rows - 1)
+
+    def _column(self, long):
+        return min(max(int((long + 180) // self.cell_size), 0), self._columns - 1)
+
+    def insert(self, lat, long):
+        """
+        Index one coordinate pair.
+
+        Args:
+            lat: Latitude, in degrees times ``scale``.
+            long: Longitude, in degrees times ``scale``.
+
+        Returns:
+            int: The position of the new entry.
+        """
+        lat, long = float(lat) / self.scale, float(long) / self.scale
+        key = self._row(lat) * self._columns + self._column(long)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = (array('L'), array('d'), array('d'))
+        position = self._count
+        cell[0].append(position)
+        cell[1].append(lat)
+        cell[2].append(long)
+        self._count += 1
+        return position
+
+    def add(self, profile):
+        """
+        Index one profile.
+
+        Args:
+            profile (person_profile): Any record with age, lat, long and blood type in that order.
+
+        Returns:
+            int: The position of the profile.
+        """
+        _, lat, long, _ = profile
+        return self.insert(lat, long)
+
+    def extend(self, profiles):
+        """
+        Index every profile of an iterable.
+
+        Args:
+            profiles (iterable): ``person_profile``-like records.
+        """
+        for profile in profiles:
+            self.add(profile)
+
+    def _cells_in(self, min_lat, max_lat, min_long, max_long):
+        """
+        Yield the cells overlapping a box, ``min_long > max_long`` crossing the antimeridian.
+        """
+        if min_long <= max_long:
+            column_ranges = (range(self._column(min_long), self._column(max_long) + 1),)
+        else:
+            column_ranges = (range(self._column(min_long), self._columns), range(0, self._column(max_long) + 1))
+        cells = self._cells
+        for row in range(self._row(min_lat), self._row(max_lat) + 1):
+            base = row * self._columns
+            for columns in column_ranges:
+                for column in columns:
+                    cell = cells.get(base + column)
+                    if cell is not None:
+                        yield cell
+
+    def bbox(self, min_lat, min_long, max_lat, max_long):
+        """
+        Find the profiles inside a bounding box, bounds included.
+
+        Args:
+            min_lat (float): Southern bound in degrees.
+            min_long (float): Western bound in degrees; greater than ``max_long``
+                for a box crossing the antimeridian.
+            max_lat (float): Northern bound in degrees.
+            max_long (float): Eastern bound in degrees.
+
+        Returns:
+            list: Positions of the matching profiles.
+        """
+        wraps = min_long > max_long
+        found = []
+        for positions, lats, longs in self._cells_in(min_lat, max_lat, min_long, max_long):
+            for position, lat, long in zip(positions, lats, longs):
+                if min_lat <= lat <= max_lat and (
+                        (min_long <= long or long <= max_long) if wraps else min_long <= long <= max_long):
+                    found.append(position)
+        return found
+
+    def _within(self, lat, long, radius_km):
+        """
+        Return ``(distance, position)`` pairs of the profiles within ``radius_km``.
+        """
+        angle = radius_km / EARTH_RADIUS_KM
+        delta_lat = math.degrees(angle)
+        min_lat, max_lat = lat - delta_lat, lat + delta_lat
+        if min_lat <= -90 or max_lat >= 90 or math.sin(angle) >= math.cos(math.radians(lat)):
+            # The circle contains a pole, every longitude is reachable
+            min_long, max_long = -180, 180
+        else:
+            delta_long = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+            min_long = (long - delta_long + 180) % 360 - 180
+            max_long = (long + delta_long + 180) % 360 - 180
+
+        # Skip points outside the circle's bounding box with plain comparisons,
+        # then compare the haversine term against its bound, asin only for matches
+        wraps = min_long > max_long
+        limit = math.sin(min(angle, math.pi) / 2) ** 2
+        phi = math.radians(lat)
+        cos_phi = math.cos(phi)
+        sin, cos, radians = math.sin, math.cos, math.radians
+        found = []
+        for positions, lats, longs in self._cells_in(max(min_lat, -90), min(max_lat, 90), min_long, max_long):
+            for position, other_lat, other_long in zip(positions, lats, longs):
+                if not min_lat <= other_lat <= max_lat or (
+                        (max_long < other_long < min_long) if wraps else not min_long <= other_long <= max_long):
+                    continue
+                other_phi = radians(other_lat)
+                a = (sin((other_phi - phi) / 2) ** 2
+                     + cos_phi * cos(other_phi) * sin(radians(other_long - long) / 2) ** 2)
+                if a <= limit:
+                    found.append((2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a))), position))
+        return found
+
+    def radius(self, lat, long, radius_km):
+        """
+        Find the profiles within a great-circle distance of a point.
+
+        Args:
+            lat (float): Latitude of the centre in degrees.
+            long (float): Longitude of the centre in degrees.
+            radius_km (float): Search radius in kilometres.
+
+        Returns:
+            list: Positions of the matching profiles, nearest first.
+        """
+        return [position for _, position in sorted(self._within(lat, long, radius_km))]
+
+    def nearest(self, lat, long, k=1):
+        """
+        Find the ``k`` profiles closest to a point.
+
+        Radius queries are repeated with a doubling radius, starting from
+        the radius expected to hold ``k`` uniformly spread profiles, until
+        ``k`` profiles are found.
+
+        Args:
+            lat (float): Latitude of the point in degrees.
+            long (float): Longitude of the point in degrees.
+            k (int): Number of profiles to return.
+
+        Returns:
+            list: ``(distance_km, position)`` pairs, nearest first.
+        """
+        k = min(k, self._count)
+        if k <= 0:
+            return []
+        radius_km = 2 * EARTH_RADIUS_KM * math.sqrt(k / self._count)
+        while True:
+            found = self._within(lat, long, radius_km)
+            if len(found) >= k or radius_km >= math.pi * EARTH_RADIUS_KM:
+                return sorted(found)[:k]
+            radius_km *= 2
+
+
+# Define a namedtuple for storing company stock data
+CompanyStock = namedtuple('CompanyStock', ['name', 'symbol', 'open', 'high', 'close', 'weight'])
+
+# Number of 4-letter symbols that exist
+SYMBOL_SPACE = len(string.ascii_uppercase) ** 4
+
+# Random draws from a company's name tried before falling back to the next free symbol
+SYMBOL_ATTEMPTS = 3
+
+
+class CompanyRegistry:
+    """
+    Symbol-indexed collection of CompanyStock records.
+
+    Lookup by symbol is a dict access. Integer positions and iteration
+    follow insertion order, so a registry can be passed wherever a list of
+    companies is expected (e.g. ``calculate_stock_market_value`` or
+    ``aggregate_tick_batch``).
+    """
+
+    def __init__(self, companies=()):
+        """
+        Args:
+            companies (iterable): CompanyStock namedtuples with unique symbols.
+        """
+        self._companies = {}
+        self._positions = []
+        for company in companies:
+            self.add(company)
+
+    def add(self, company):
+        """
+        Register a company.
+
+        Args:
+            company (CompanyStock): The company, its symbol must not be registered yet.
+        """
+        if company.symbol in self._companies:
+            raise ValueError(f'Duplicate symbol {company.symbol!r}')
+        self._companies[company.symbol] = company
+        self._positions.append(company)
+
+    def __getitem__(self, key):
+        """
+        Args:
+            key (str | int): A symbol, or a position in insertion order as in a list.
+        """
+        if isinstance(key, int):
+            return self._positions[key]
+        return self._companies[key]
+
+    def get(self, symbol, default=None):
+        return self._companies.get(symbol, default)
+
+    def __contains__(self, symbol):
+        return symbol in self._companies
+
+    def __iter__(self):
+        return iter(self._companies.values())
+
+    def __len__(self):
+        return len(self._companies)
+
+    def __repr__(self):
+        return f'CompanyRegistry(<{len(self)} companies>)'
+
+    def symbols(self):
+        """
+        Returns:
+            list: The registered symbols in insertion order.
+        """
+        return list(self._companies)
+
+
+def _unique_symbol(name, taken, fallback, rnd=random):
+    """
+    Pick a clean 4-letter symbol for a company that is not taken yet.
+
+    A few random samples of the letters of the name are tried first, as in
+    the default mode. After that the next free symbol of ``fallback`` is
+    used; since ``fallback`` only moves forward, generating n symbols stays
+    O(n + SYMBOL_SPACE) overall instead of retrying quadratically.
+
+    Args:
+        name (str): Company name.
+        taken (container): Symbols already in use.
+        fallback (iterator): Every 4-letter symbol in a fixed order.
+        rnd (random.Random): Random generator of the samples, the ``random`` module by default.
+
+    Returns:
+        str: The symbol.
+    """
+    letters = [character for character in name.upper() if character in string.ascii_uppercase]
+    if len(letters) >= 4:
+        for _ in range(SYMBOL_ATTEMPTS):
+            symbol = ''.join(rnd.sample(letters, 4))
+            if symbol not in taken:
+                return symbol
+
+    for symbol in fallback:
+        if symbol not in taken:
+            return symbol
+    raise ValueError(f'All {SYMBOL_SPACE} symbols are taken')
+
+
+# Number of distinct company names kept by a CompanyNamePool by default
+COMPANY_NAME_POOL_SIZE = 10000
+
+# Name draws allowed per missing name before a pool gives up on finding new distinct names
+COMPANY_NAME_ATTEMPTS = 20
+
+
+class CompanyNamePool:
+    """
+    Cache of distinct Faker company names, optionally persisted to disk.
+
+    ``fake.company()`` is the slowest part of ``generate_companies``, so a
+    pool draws ``size`` distinct names once and companies then sample from
+    it. With a ``path`` the names are stored as JSON and reused by later
+    runs: a pool file that is too small is topped up with new names only,
+    one older than ``max_age`` seconds is rebuilt, and ``refresh`` evicts
+    part of the names and replaces them with fresh ones.
+    """
+
+    def __init__(self, size=COMPANY_NAME_POOL_SIZE, path=None, max_age=None, seed=None):
+        """
+        Args:
+            size (int): Number of distinct names in the pool.
+            path (str, optional): JSON file the pool is loaded from and saved to.
+            max_age (float, optional): Age in seconds after which a saved pool is rebuilt.
+            seed (int | str, optional): Seed of the Faker instance drawing the names
+                and of the random generator choosing the names ``refresh`` evicts.
+        """
+        if size <= 0:
+            raise ValueError('size must be positive')
+        self.size = size
+        self.path = path
+        self.max_age = max_age
+        self.seed = seed
+        self._fake = None
+        self._random = random.Random(seed)
+        self.names = []
+        self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __repr__(self):
+        return f'CompanyNamePool(<{len(self)} names>)'
+
+    def _new_names(self, count, taken):
+        """
+        Draw ``count`` company names distinct from each other and from ``taken``.
+        """
+        if self._fake is None:
+            self._fake = make_fake(self.seed)
+        company = self._fake.company
+        seen = set(taken)
+        names = []
+        for _ in range(count * COMPANY_NAME_ATTEMPTS):
+            if len(names) == count:
+                return names
+            name = company()
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+        if len(names) == count:
+            return names
+        raise ValueError(f'Could not draw {count} distinct new company names')
+
+    def load(self):
+        """
+        Load the saved names if they are fresh, drawing and saving whatever is missing.
+
+        Returns:
+            CompanyNamePool: ``self``, to allow chaining.
+        """
+        import os
+        import time
+
+        names = []
+        if self.path is not None and os.path.exists(self.path):
+            if self.max_age is None or time.time() - os.path.getmtime(self.path) <= self.max_age:
+                import json
+                with open(self.path) as source:
+                    names = json.load(source)['names']
+
+        if len(names) >= self.size:
+            self.names = names[:self.size]
+        else:
+            self.names = names + self._new_names(self.size - len(names), names)
+            self.save()
+        return self
+
+    def save(self):
+        """
+        Write the names to ``path``, atomically replacing any previous file.
+        """
+        if self.path is None:
+            return
+        import json
+        import os
+
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as target:
+            json.dump({'size': len(self.names), 'names': self.names}, target)
+        os.replace(temporary, self.path)
+
+    def refresh(self, fraction=1.0, rnd=None):
+        """
+        Evict a random part of the names and replace it with newly drawn ones.
+
+        Args:
+            fraction (float): Share of the pool to replace, 1.0 rebuilds it entirely.
+            rnd (random.Random, optional): Random generator choosing the evicted
+                names, the pool's own one, seeded with ``seed``, by default.
+
+        Returns:
+            CompanyNamePool: ``self``, to allow chaining.
+        """
+        if not 0 <= fraction <= 1:
+            raise ValueError('fraction must be between 0 and 1')
+        count = round(fraction * len(self.names))
+        evicted = set((rnd or self._random).sample(range(len(self.names)), count))
+        kept = [name for position, name in enumerate(self.names) if position not in evicted]
+        self.names = kept + self._new_names(count, self.names)
+        self.save()
+        return self
+
+    def draw(self, n, rnd=random):
+        """
+        Pick ``n`` names from the pool.
+
+        Args:
+            n (int): Number of names.
+            rnd (random.Random): Random generator of the picks, the ``random`` module by default.
+
+        Returns:
+            list: Distinct names if ``n`` does not exceed the pool size,
+            otherwise names sampled with replacement.
+        """
+        if n <= len(self.names):
+            return rnd.sample(self.names, n)
+        return rnd.choices(self.names, k=n)
+
+
+# Generate stock data for 100 companies
+def generate_companies(num_companies=100, unique_symbols=False, name_pool=None, seed=None):
+    """
+    Generate fake stock data for a specified number of companies.
+
+    Args:
+        num_companies (int): The number of companies to generate data for. Default is 100.
+        unique_symbols (bool): If True, every symbol is made of 4 uppercase
+            letters and no two companies share one, and the
+            companies come back as a ``CompanyRegistry``.
+        name_pool (CompanyNamePool, optional): If given, names are drawn from
+            the pool instead of calling ``fake.company()`` for every company.
+        seed (int, optional): If given, the companies are drawn from a private
+            ``random.Random`` and Faker instance seeded with it, leaving the
+            module-level ``random`` state and ``fake`` untouched.
+
+    Returns:
+        list: A list of CompanyStock namedtuples containing the company name, symbol,
+              open price, high price, close price, and assigned weight.
+              A ``CompanyRegistry`` of them if ``unique_symbols`` is True.
+        float: The total weight of all companies combined.
+    """
+    if unique_symbols and num_companies > SYMBOL_SPACE:
+        raise ValueError(f'Cannot generate more than {SYMBOL_SPACE} unique symbols')
+
+    rnd = random if seed is None else random.Random(seed)
+    if name_pool is not None:
+        names = name_pool.draw(num_companies, rnd)
+    else:
+        fake = get_fake() if seed is None else make_fake(seed)
+        names = (fake.company() for _ in range(num_companies))
+    companies = CompanyRegistry() if unique_symbols else []
+    fallback = (''.join(letters) for letters in product(string.ascii_uppercase, repeat=4))
+    total_weight = 0
+
+    for name in names:
+        # Generate company symbol
+        if unique_symbols:
+            symbol = _unique_symbol(name, companies, fallback, rnd)
+        else:
+            symbol = ''.join(rnd.sample(name, 4)).upper()  # Create a 4-letter symbol from the company name
+
+        # Generate random stock prices
+        open_price = round(rnd.uniform(100, 500), 2)  # Random open price between 100 and 500
+        high_price = round(open_price + rnd.uniform(0, 50), 2)  # High price must be higher than open price
+        close_price = round(rnd.uniform(open_price, high_price), 2)  # Close price between open and high
+
+        # Assign a random weight
+        weight = rnd.uniform(0.5, 2.0)
+        total_weight += weight
+
+        # Append company data to the list
+        company = CompanyStock(name, symbol, open_price, high_price, close_price, weight)
+        if unique_symbols:
+            companies.add(company)
+        else:
+            companies.append(company)
+
+    return companies, total_weight
+
+
+# Calculate the stock market values
+def calculate_stock_market_value(companies, total_weight):
+    """
+    Calculate the stock market's open, high, and close values based on the weighted average
+    of each company's stock prices.
+
+    Args:
+        companies (list): A list of CompanyStock namedtuples containing stock data for each company.
+        total_weight (float): The sum of the weights of all companies.
+
+    Returns:
+        tuple: A tuple containing the open market value, high market value, and close market value.
+    """
+    open_market_value = sum(company.open * company.weight for company in companies) / total_weight
+    high_market_value = sum(company.high * company.weight for company in companies) / total_weight
+    close_market_value = sum(company.close * company.weight for company in companies) / total_weight
+    return open_market_value, high_market_value, close_market_value
+
+
+class MarketIndex:
+    """
+    Stateful market index with O(1) updates.
+
+    The weighted sums of the open, high and close prices and the total
+    weight are maintained incrementally, so a price change, addition or
+    removal costs O(1) instead of a full ``calculate_stock_market_value``.
+    Floating-point drift from the incremental updates is removed by a full
+    ``math.fsum`` recompute every ``recompute_every`` changes.
+    """
+
+    def __init__(self, companies=(), recompute_every=10000):
+        """
+        Args:
+            companies (iterable): CompanyStock namedtuples with unique symbols.
+            recompute_every (int): Number of changes between two drift corrections.
+        """
+        self.recompute_every = recompute_every
+        self._companies = {}
+        for company in companies:
+            if company.symbol in self._companies:
+                raise ValueError(f'Duplicate symbol {company.symbol!r}')
+            self._companies[company.symbol] = company
+        self.recompute()
+
+    @classmethod
+    def from_generated(cls, generated, recompute_every=10000, seed=None):
+        """
+        Build an index from the ``(companies, total_weight)`` pair of ``generate_companies``.
+
+        Without ``unique_symbols=True``, generated symbols often collide; a
+        company whose symbol is already taken gets a new one as in
+        ``generate_companies(..., unique_symbols=True)``, so every generated
+        company becomes a constituent. The new symbols are drawn from a
+        private ``random.Random(seed)``, reproducible for a given ``seed``.
+        """
+        companies, _ = generated
+        rnd = random.Random(seed)
+        taken = set()
+        fallback = (''.join(letters) for letters in product(string.ascii_uppercase, repeat=4))
+        constituents = []
+        for company in companies:
+            if company.symbol in taken:
+                company = company._replace(symbol=_unique_symbol(company.name, taken, fallback, rnd))
+            taken.add(company.symbol)
+            constituents.append(company)
+        return cls(constituents, recompute_every)
+
+    def __len__(self):
+        return len(self._companies)
+
+    def __contains__(self, symbol):
+        return symbol in self._companies
+
+    def __getitem__(self, symbol):
+        return self._companies[symbol]
+
+    def recompute(self):
+        """
+        Recompute the weighted sums from scratch with ``math.fsum``.
+        """
+        companies = self._companies.values()
+        self.total_weight = math.fsum(company.weight for company in companies)
+        self._open_sum = math.fsum(company.open * company.weight for company in companies)
+        self._high_sum = math.fsum(company.high * company.weight for company in companies)
+        self._close_sum = math.fsum(company.close * company.weight for company in companies)
+        self._changes = 0
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes >= self.recompute_every:
+            self.recompute()
+
+    def _apply(self, company, sign):
+        weight = company.weight * sign
+        self.total_weight += weight
+        self._open_sum += company.open * weight
+        self._high_sum += company.high * weight
+        self._close_sum += company.close * weight
+
+    def update_price(self, symbol, open=None, high=None, close=None):
+        """
+        Change some of a constituent's prices in O(1).
+
+        Args:
+            symbol (str): Symbol of the company.
+            open (float, optional): New open price.
+            high (float, optional): New high price.
+            close (float, optional): New close price.
+
+        Returns:
+            CompanyStock: The updated record.
+        """
+        old = self._companies[symbol]
+        new = old._replace(open=old.open if open is None else open,
+                           high=old.high if high is None else high,
+                           close=old.close if close is None else close)
+        self._open_sum += (new.open - old.open) * old.weight
+        self._high_sum += (new.high - old.high) * old.weight
+        self._close_sum += (new.close - old.close) * old.weight
+        self._companies[symbol] = new
+        self._changed()
+        return new
+
+    def add_company(self, company):
+        """
+        Add a constituent in O(1).
+
+        Args:
+            company (CompanyStock): The company, its symbol must be new to the index.
+        """
+        if company.symbol in self._companies:
+            raise ValueError(f'Duplicate symbol {company.symbol!r}')
+        self._companies[company.symbol] = company
+        self._apply(company, 1)
+        self._changed()
+
+    def remove_company(self, symbol):
+        """
+        Remove a constituent in O(1).
+
+        Args:
+            symbol (str): Symbol of the company.
+
+        Returns:
+            CompanyStock: The removed record.
+        """
+        company = self._companies.pop(symbol)
+        self._apply(company, -1)
+        self._changed()
+        return company
+
+    def value(self):
+        """
+        Current market values, as returned by ``calculate_stock_market_value``.
+
+        Returns:
+            tuple: A tuple containing the open market value, high market value, and close market value.
+        """
+        if not self._companies:
+            raise ValueError('The index has no constituents')
+        return (self._open_sum / self.total_weight, self._high_sum / self.total_weight,
+                self._close_sum / self.total_weight)
+
+
+# Struct-of-arrays market data: prices is a (3, N) array of open, high and
+# close rows, weights an (N,) array
+MarketArrays = namedtuple('MarketArrays', ['prices', 'weights'])
+
+
+def companies_to_arrays(companies):
+    """
+    Convert CompanyStock records into struct-of-arrays form.
+
+    Args:
+        companies (list): A list of CompanyStock namedtuples.
+
+    Returns:
+        MarketArrays: float64 (3, N) open/high/close prices and (N,) weights.
+    """
+    np = _require_numpy()
+    prices = np.array([[company.open for company in companies],
+                       [company.high for company in companies],
+                       [company.close for company in companies]], dtype=np.float64).reshape(3, len(companies))
+    weights = np.fromiter((company.weight for company in companies), dtype=np.float64, count=len(companies))
+    return MarketArrays(prices, weights)
+
+
+def calculate_stock_market_value_vectorized(prices, weights, total_weight=None):
+    """
+    Calculate weighted average market values for any number of price series at once.
+
+    All open, high and close values (and every scenario) are reduced in one
+    fused matrix-vector product, ``prices @ weights``, instead of one
+    Python pass per value.
+
+    Args:
+        prices (array-like): Prices with companies on the last axis, e.g. the
+            (3, N) ``MarketArrays.prices`` or an (S, 3, N) stack of scenarios.
+        weights (array-like): (N,) weight of each company.
+        total_weight (float, optional): The sum of the weights. Computed from
+            ``weights`` if omitted.
+
+    Returns:
+        numpy.ndarray: Market values of shape ``prices.shape[:-1]``, e.g. the
+        open, high and close values of every scenario.
+    """
+    np = _require_numpy()
+    prices = np.asarray(prices, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if prices.shape[-1] != weights.shape[0]:
+        raise ValueError(f'prices have {prices.shape[-1]} companies but weights have {weights.shape[0]}')
+    if total_weight is None:
+        total_weight = weights.sum()
+    return (prices @ weights) / total_weight
+
+
+# Sectors drawn by assign_baskets
+SECTORS = ('Technology', 'Healthcare', 'Financials', 'Energy', 'Industrials', 'Consumer', 'Utilities', 'Materials')
+
+# CompanyStock fields followed by the names of the sector and baskets the company belongs to
+BasketCompanyStock = namedtuple('BasketCompanyStock', CompanyStock._fields + ('baskets',))
+
+# Company/basket membership pairs sorted by basket: names of the baskets, and for
+# every pair the company's index and the basket's index into names
+BasketMembership = namedtuple('BasketMembership', ['names', 'company', 'basket'])
+
+
+def assign_baskets(companies, sectors=SECTORS, baskets=None, seed=None):
+    """
+    Attach a random sector and any custom baskets to every company.
+
+    Args:
+        companies (iterable): CompanyStock namedtuples.
+        sectors (sequence): Sector names, one is drawn per company. Empty for no sectors.
+        baskets (dict, optional): Custom basket name mapped to the symbols of its
+            members; baskets may overlap with each other and with the sectors.
+        seed (int, optional): Seed of the sector draws.
+
+    Returns:
+        list: ``BasketCompanyStock`` records, a ``CompanyRegistry`` of them if
+        ``companies`` is one.
+    """
+    rnd = random.Random(seed)
+    members = {}
+    for basket, symbols in (baskets or {}).items():
+        for symbol in symbols:
+            members.setdefault(symbol, []).append(basket)
+
+    # A company listed twice, or in a basket named like its sector, is a member once
+    records = [BasketCompanyStock(*company[:len(CompanyStock._fields)],
+                                  tuple(dict.fromkeys(((rnd.choice(sectors),) if sectors else ())
+                                                      + tuple(members.get(company.symbol, ())))))
+               for company in companies]
+    return CompanyRegistry(records) if isinstance(companies, CompanyRegistry) else records
+
+
+def calculate_sub_indices(companies):
+    """
+    Calculate the open, high and close values of every basket in one pass.
+
+    Each company's weighted prices are computed once and added to the
+    running sums of each of its distinct baskets, so dozens of overlapping sector
+    and custom sub-indices cost one pass over the companies instead of one
+    ``calculate_stock_market_value`` call each.
+
+    Args:
+        companies (iterable): ``BasketCompanyStock`` namedtuples.
+
+    Returns:
+        dict: Basket name mapped to its (open, high, close) market values,
+        as returned by ``calculate_stock_market_value`` for its members.
+    """
+    sums = {}
+    for company in companies:
+        weight = company.weight
+        weighted_open = company.open * weight
+        weighted_high = company.high * weight
+        weighted_close = company.close * weight
+        for basket in dict.fromkeys(company.baskets):
+            basket_sums = sums.get(basket)
+            if basket_sums is None:
+                sums[basket] = [weight, weighted_open, weighted_high, weighted_close]
+            else:
+                basket_sums[0] += weight
+                basket_sums[1] += weighted_open
+                basket_sums[2] += weighted_high
+                basket_sums[3] += weighted_close
+    return {basket: (open_sum / total_weight, high_sum / total_weight, close_sum / total_weight)
+            for basket, (total_weight, open_sum, high_sum, close_sum) in sums.items()}
+
+
+def basket_membership(companies):
+    """
+    Convert the baskets of companies into membership arrays.
+
+    Args:
+        companies (list): ``BasketCompanyStock`` namedtuples, in the order of their ``MarketArrays``.
+
+    Returns:
+        BasketMembership: Basket names in first-seen order and int64 company and
+        basket indices of every membership, sorted by basket.
+    """
+    np = _require_numpy()
+    names = {}
+    pairs = [(names.setdefault(basket, len(names)), index)
+             for index, company in enumerate(companies) for basket in dict.fromkeys(company.baskets)]
+    pairs.sort()
+    basket = np.fromiter((pair[0] for pair in pairs), dtype=np.int64, count=len(pairs))
+    company = np.fromiter((pair[1] for pair in pairs), dtype=np.int64, count=len(pairs))
+    return BasketMembership(tuple(names), company, basket)
+
+
+def calculate_sub_indices_vectorized(prices, weights, membership):
+    """
+    Calculate every basket's market values with one segmented reduction.
+
+    The weighted prices of all memberships are gathered in basket order
+    and summed per basket with ``numpy.add.reduceat``, for any number of
+    leading price axes (e.g. open/high/close of many scenarios).
+
+    Args:
+        prices (array-like): Prices with companies on the last axis, e.g. the
+            (3, N) ``MarketArrays.prices`` or an (S, 3, N) stack of scenarios.
+        weights (array-like): (N,) weight of each company.
+        membership (BasketMembership): Memberships as returned by ``basket_membership``.
+
+    Returns:
+        numpy.ndarray: Values of shape ``prices.shape[:-1] + (len(membership.names),)``,
+        e.g. ``values[:, j]`` are the open, high and close of ``membership.names[j]``.
+    """
+    np = _require_numpy()
+    prices = np.asarray(prices, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if prices.shape[-1] != weights.shape[0]:
+        raise ValueError(f'prices have {prices.shape[-1]} companies but weights have {weights.shape[0]}')
+    if len(membership.company) == 0:
+        return np.empty(prices.shape[:-1] + (0,))
+
+    member_weights = weights[membership.company]
+    starts = np.flatnonzero(np.r_[True, membership.basket[1:] != membership.basket[:-1]])
+    weighted = np.add.reduceat(prices[..., membership.company] * member_weights, starts, axis=-1)
+    return weighted / np.add.reduceat(member_weights, starts)
+
+
+# Define a namedtuple for a single price tick, timestamps count ticks
+Tick = namedtuple('Tick', ['timestamp', 'symbol', 'price'])
+
+# OHLC bar of one company, the CompanyStock fields followed by the bar's low and start time
+OHLCBar = namedtuple('OHLCBar', CompanyStock._fields + ('low', 'bar_start'))
+
+# Ticks of a batch simulation as arrays: timestamps, company indices and prices
+TickBatch = namedtuple('TickBatch', ['timestamp', 'company', 'price'])
+
+
+def simulate_ticks(companies, num_ticks, volatility=0.001, seed=None, start_timestamp=0):
+    """
+    Simulate price ticks for a set of companies.
+
+    Every tick picks a random company and moves its price by a lognormal
+    step, starting from the company's close price.
+
+    Args:
+        companies (list): A list of CompanyStock namedtuples.
+        num_ticks (int): The number of ticks to generate.
+        volatility (float): Standard deviation of the log return of one tick.
+        seed (int, optional): Seed for the random generator.
+        start_timestamp (int): Timestamp of the first tick.
+
+    Yields:
+        Tick: The simulated ticks in timestamp order.
+    """
+    rnd = random.Random(seed)
+    prices = [company.close for company in companies]
+    symbols = [company.symbol for company in companies]
+    randrange, gauss, exp = rnd.randrange, rnd.gauss, math.exp
+    num_companies = len(companies)
+
+    for timestamp in range(start_timestamp, start_timestamp + num_ticks):
+        index = randrange(num_companies)
+        price = prices[index] = prices[index] * exp(gauss(0, volatility))
+        yield Tick(timestamp, symbols[index], price)
+
+
+async def simulate_ticks_async(companies, num_ticks, volatility=0.001, seed=None, start_timestamp=0,
+                               yield_every=1000):
+    """
+    Asynchronous stream of simulated price ticks.
+
+    Produces the same ticks as ``simulate_ticks`` and hands control back to
+    the event loop every ``yield_every`` ticks.
+
+    Args:
+        companies (list): A list of CompanyStock namedtuples.
+        num_ticks (int): The number of ticks to generate.
+        volatility (float): Standard deviation of the log return of one tick.
+        seed (int, optional): Seed for the random generator.
+        start_timestamp (int): Timestamp of the first tick.
+        yield_every (int): Number of ticks between two yields to the event loop.
+
+    Yields:
+        Tick: The simulated ticks in timestamp order.
+    """
+    import asyncio
+
+    for count, tick in enumerate(simulate_ticks(companies, num_ticks, volatility, seed, start_timestamp), 1):
+        yield tick
+        if count % yield_every == 0:
+            await asyncio.sleep(0)
+
+
+class OHLCBarAggregator:
+    """
+    Aggregate a tick stream into OHLC bars of ``bar_interval`` timestamps.
+
+    Only the current bar of each symbol is kept, so memory is constant per
+    symbol however long the stream runs. Ticks must arrive in timestamp
+    order; a symbol's bar is emitted when its first tick of a later bar
+    arrives, or by ``flush``.
+    """
+
+    def __init__(self, companies, bar_interval):
+        """
+        Args:
+            companies (list): CompanyStock namedtuples with unique symbols, e.g. from
+                ``generate_companies(n, unique_symbols=True)``; ticks only carry the symbol.
+            bar_interval (int): Length of a bar in timestamp units.
+        """
+        if bar_interval <= 0:
+            raise ValueError('bar_interval must be positive')
+        self.bar_interval = bar_interval
+        self._companies = {}
+        for company in companies:
+            if company.symbol in self._companies:
+                raise ValueError(f'Duplicate symbol {company.symbol!r}')
+            self._companies[company.symbol] = company
+        # Symbol mapped to its current [bar_start, open, high, low, close]
+        self._bars = {}
+
+    def _make_bar(self, symbol, state):
+        company = self._companies[symbol]
+        bar_start, open_price, high_price, low_price, close_price = state
+        return OHLCBar(company.name, symbol, open_price, high_price, close_price, company.weight,
+                       low_price, bar_start)
+
+    def add(self, tick):
+        """
+        Add one tick.
+
+        Args:
+            tick (Tick): The next tick of the stream.
+
+        Returns:
+            OHLCBar | None: The symbol's previous bar if this tick starts a new one.
+        """
+        bar_start = tick.timestamp - tick.timestamp % self.bar_interval
+        price = tick.price
+        state = self._bars.get(tick.symbol)
+        if state is not None and state[0] == bar_start:
+            if price > state[2]:
+                state[2] = price
+            elif price < state[3]:
+                state[3] = price
+            state[4] = price
+            return None
+
+        self._bars[tick.symbol] = [bar_start, price, price, price, price]
+        return None if state is None else self._make_bar(tick.symbol, state)
+
+    def aggregate(self, ticks):
+        """
+        Consume a tick stream, yielding every bar as soon as it completes.
+
+        Args:
+            ticks (iterable): Ticks in timestamp order.
+
+        Yields:
+            OHLCBar: Completed bars.
+        """
+        for tick in ticks:
+            bar = self.add(tick)
+            if bar is not None:
+                yield bar
+
+    def flush(self):
+        """
+        Emit the bars still in progress and forget them.
+
+        Returns:
+            list: The open OHLCBar of every symbol.
+        """
+        bars = [self._make_bar(symbol, state) for symbol, state in self._bars.items()]
+        self._bars.clear()
+        return bars
+
+
+def simulate_tick_batch(prices, num_ticks, volatility=0.001, seed=None, start_timestamp=0):
+    """
+    Simulate a batch of ticks with NumPy, millions of ticks per second.
+
+    Same model as ``simulate_ticks``: each tick moves one random company by
+    a lognormal step. The per-company paths are built with one sort and one
+    cumulative sum rather than a Python loop.
+
+    Args:
+        prices (array-like): (N,) price of each company before the batch.
+        num_ticks (int): The number of ticks to generate.
+        volatility (float): Standard deviation of the log return of one tick.
+        seed (int | numpy.random.Generator, optional): Seed or generator.
+        start_timestamp (int): Timestamp of the first tick.
+
+    Returns:
+        tuple: The ``TickBatch`` and the (N,) prices after the batch, to
+        start the next batch from.
+    """
+    np = _require_numpy()
+    rng = np.random.default_rng(seed)
+    prices = np.asarray(prices, dtype=np.float64)
+    num_companies = len(prices)
+
+    company = rng.integers(0, num_companies, size=num_ticks)
+    log_returns = rng.normal(0, volatility, size=num_ticks)
+
+    # Group the ticks by company, keeping time order inside each group
+    order = np.argsort(company, kind='stable')
+    sorted_company = company[order]
+    cumulative = np.cumsum(log_returns[order])
+    group_starts = np.searchsorted(sorted_company, np.arange(num_companies))
+    offsets = np.concatenate(([0.0], cumulative))[group_starts]
+    sorted_price = prices[sorted_company] * np.exp(cumulative - offsets[sorted_company])
+
+    price = np.empty(num_ticks, dtype=np.float64)
+    price[order] = sorted_price
+    last_prices = prices.copy()
+    group_ends = np.searchsorted(sorted_company, np.arange(num_companies), side='right')
+    traded = group_ends > group_starts
+    last_prices[traded] = sorted_price[group_ends[traded] - 1]
+
+    timestamp = np.arange(start_timestamp, start_timestamp + num_ticks)
+    return TickBatch(timestamp, company, price), last_prices
+
+
+def aggregate_tick_batch(batch, companies, bar_interval):
+    """
+    Aggregate a ``TickBatch`` into OHLC bars with vectorized reductions.
+
+    Args:
+        batch (TickBatch): Ticks from ``simulate_tick_batch``.
+        companies (list): The CompanyStock namedtuples indexed by ``batch.company``.
+        bar_interval (int): Length of a bar in timestamp units.
+
+    Returns:
+        list: One OHLCBar per company and bar with ticks, ordered by company then bar.
+    """
+    np = _require_numpy()
+    if len(batch.timestamp) == 0:
+        return []
+
+    bar_start = batch.timestamp - batch.timestamp % bar_interval
+    order = np.lexsort((batch.timestamp, bar_start, batch.company))
+    company = batch.company[order]
+    bar_start = bar_start[order]
+    price = batch.price[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], (company[1:] != company[:-1]) | (bar_start[1:] != bar_start[:-1]))))
+    ends = np.append(starts[1:], len(price))
+    high = np.maximum.reduceat(price, starts)
+    low = np.minimum.reduceat(price, starts)
+
+    bars = []
+    for index, start, open_price, high_price, close_price, low_price in zip(
+            company[starts].tolist(), bar_start[starts].tolist(), price[starts].tolist(), high.tolist(),
+            price[ends - 1].tolist(), low.tolist()):
+        company_stock = companies[index]
+        bars.append(OHLCBar(company_stock.name, company_stock.symbol, open_price, high_price, close_price,
+                            company_stock.weight, low_price, start))
+    return bars
+
+
+# First bytes of a dataset file written by save_dataset, and its format version
+DATASET_MAGIC = b'S8DS'
+DATASET_VERSION = 1
+
+# Columns of a dataset file and their array typecodes. Coordinates are stored
+# as int64 in FIXED_POINT_SCALE units so Faker's Decimals round-trip exactly;
+# strings are a UTF-8 blob plus int64 offsets.
+PROFILE_COLUMNS = {'age': 'B', 'lat': 'q', 'long': 'q', 'blood_type': 'B'}
+COMPANY_COLUMNS = {'name_offsets': 'q', 'name_data': 'B', 'symbol_offsets': 'q', 'symbol_data': 'B',
+                   'open': 'd', 'high': 'd', 'close': 'd', 'weight': 'd'}
+
+
+def _string_columns(strings):
+    """
+    Pack strings into an offsets array and a UTF-8 byte blob.
+    """
+    offsets = array('q', [0])
+    data = bytearray()
+    for value in strings:
+        data += value.encode('utf-8')
+        offsets.append(len(data))
+    return offsets, array('B', data)
+
+
+def save_dataset(path, profiles=(), companies=()):
+    """
+    Write profiles and companies to a compact binary file.
+
+    The file holds a small JSON header followed by one 8-byte aligned
+    column per field, ready to be memory-mapped by ``load_dataset``.
+
+    Args:
+        path (str): File to write.
+        profiles (iterable): ``person_profile``-like records, with ``Decimal`` or float coordinates.
+        companies (iterable): CompanyStock namedtuples.
+
+    Returns:
+        dict: The header that was written.
+    """
+    import json
+
+    columns = {name: array(typecode) for name, typecode in PROFILE_COLUMNS.items()}
+    for age, lat, long, blood_type in profiles:
+        columns['age'].append(age)
+        columns['lat'].append(round(lat * FIXED_POINT_SCALE))
+        columns['long'].append(round(long * FIXED_POINT_SCALE))
+        columns['blood_type'].append(BLOOD_GROUP_CODES[blood_type])
+
+    companies = list(companies)
+    columns['name_offsets'], columns['name_data'] = _string_columns(company.name for company in companies)
+    columns['symbol_offsets'], columns['symbol_data'] = _string_columns(company.symbol for company in companies)
+    for field in ('open', 'high', 'close', 'weight'):
+        columns[field] = array('d', (getattr(company, field) for company in companies))
+
+    # Lay the columns out after the header, each aligned to 8 bytes
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        layout[name] = {'typecode': column.typecode, 'offset': offset, 'length': len(column)}
+        offset += -(-len(column) * column.itemsize // 8) * 8
+    header = {
+        'version': DATASET_VERSION,
+        'byteorder': sys.byteorder,
+        'fixed_point_scale': FIXED_POINT_SCALE,
+        'num_profiles': len(columns['age']),
+        'num_companies': len(companies),
+        'columns': layout,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(len(DATASET_MAGIC) + 4 + len(header_bytes)) % 8)
+
+    with open(path, 'wb') as output:
+        output.write(DATASET_MAGIC)
+        output.write(len(header_bytes).to_bytes(4, 'little'))
+        output.write(header_bytes)
+        for column in columns.values():
+            output.write(column.tobytes())
+            output.write(b'\0' * (-len(column) * column.itemsize % 8))
+    return header
+
+
+class Dataset:
+    """
+    Memory-mapped dataset written by ``save_dataset``.
+
+    ``columns`` maps every column name to a typed ``memoryview`` over the
+    mapped file, so loading copies nothing and processes that open the same
+    file share its pages. Records are rebuilt on access: profiles as
+    ``person_profile`` with ``Decimal`` coordinates, companies as
+    ``CompanyStock``.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): File written by ``save_dataset``.
+        """
+        import json
+        import mmap
+
+        with open(path, 'rb') as source:
+            self._mmap = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(DATASET_MAGIC)]) != DATASET_MAGIC:
+            buffer.release()
+            self._mmap.close()
+            raise ValueError(f'{path} is not a session8 dataset')
+
+        header_start = len(DATASET_MAGIC) + 4
+        header_length = int.from_bytes(buffer[len(DATASET_MAGIC):header_start], 'little')
+        self.header = json.loads(bytes(buffer[header_start:header_start + header_length]))
+        if self.header['version'] != DATASET_VERSION or self.header['byteorder'] != sys.byteorder:
+            buffer.release()
+            self._mmap.close()
+            raise ValueError(f'{path} has an unsupported version or byte order')
+
+        data_start = header_start + header_length
+        self.columns = {}
+        for name, column in self.header['columns'].items():
+            start = data_start + column['offset']
+            itemsize = array(column['typecode']).itemsize
+            self.columns[name] = buffer[start:start + column['length'] * itemsize].cast(column['typecode'])
+        self._buffer = buffer
+        self._scale = Decimal(self.header['fixed_point_scale'])
+
+    @property
+    def num_profiles(self):
+        return self.header['num_profiles']
+
+    @property
+    def num_companies(self):
+        return self.header['num_companies']
+
+    def profile(self, index):
+        """
+        Returns:
+            person_profile: The profile at ``index``.
+        """
+        columns = self.columns
+        return person_profile(columns['age'][index], Decimal(columns['lat'][index]) / self._scale,
+                              Decimal(columns['long'][index]) / self._scale,
+                              BLOOD_GROUPS[columns['blood_type'][index]])
+
+    def profiles(self):
+        """
+        Yields:
+            person_profile: Every profile, in the order they were saved.
+        """
+        for index in range(self.num_profiles):
+            yield self.profile(index)
+
+    def _string(self, name, index):
+        offsets = self.columns[f'{name}_offsets']
+        return bytes(self.columns[f'{name}_data'][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def company(self, index):
+        """
+        Returns:
+            CompanyStock: The company at ``index``.
+        """
+        columns = self.columns
+        return CompanyStock(self._string('name', index), self._string('symbol', index), columns['open'][index],
+                            columns['high'][index], columns['close'][index], columns['weight'][index])
+
+    def companies(self):
+        """
+        Returns:
+            list: Every company as a CompanyStock, in the order they were saved.
+        """
+        return [self.company(index) for index in range(self.num_companies)]
+
+    def close(self):
+        """
+        Release the column views and unmap the file.
+        """
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_dataset(path):
+    """
+    Memory-map a dataset written by ``save_dataset``.
+
+    Args:
+        path (str): File to open.
+
+    Returns:
+        Dataset: Zero-copy column views and record accessors. Close it, or
+        use it as a context manager, to unmap the file.
+    """
+    return Dataset(path)
+
+
+# File formats supported by the exporters
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# Number of rows the exporters hold in memory at once
+EXPORT_CHUNK_SIZE = 65536
+
+
+def _open_export(path, compress, compresslevel):
+    """
+    Open an export file for binary writing, gzip compressed if asked to.
+    """
+    if compress:
+        import gzip
+
+        return gzip.open(path, 'wb', compresslevel=compresslevel)
+    return open(path, 'wb')
+
+
+def _json_value(value):
+    """
+    Format one value as JSON, writing Decimals as exact JSON numbers.
+    """
+    if isinstance(value, str):
+        import json
+
+        return json.dumps(value)
+    if value is None:
+        return 'null'
+    return str(value)
+
+
+def export_records(records, path, format='csv', chunk_size=EXPORT_CHUNK_SIZE, compress=False, compresslevel=6):
+    """
+    Stream namedtuple or dict records to a CSV or JSONL file in fixed-size chunks.
+
+    Records are pulled from the iterable ``chunk_size`` at a time, so
+    profiles or CompanyStock records can be exported straight from a
+    generator with bounded memory. The header (CSV) or keys (JSONL) come
+    from the first record's fields.
+
+    Args:
+        records (iterable): ``person_profile``, ``CompanyStock`` or other namedtuples, or dicts.
+        path (str): File to write.
+        format (str): One of ``EXPORT_FORMATS``.
+        chunk_size (int): Number of records formatted and written at once.
+        compress (bool): If True, the file is gzip compressed.
+        compresslevel (int): gzip compression level.
+
+    Returns:
+        int: The number of records written.
+    """
+    import csv
+    import io
+
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {format!r}, expected one of {EXPORT_FORMATS}')
+
+    records = iter(records)
+    count = 0
+    fields = None
+    with _open_export(path, compress, compresslevel) as output:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            if fields is None:
+                fields = list(chunk[0].keys()) if isinstance(chunk[0], dict) else list(chunk[0]._fields)
+                if format == 'csv':
+                    output.write((','.join(fields) + '\n').encode('utf-8'))
+                keys = [_json_value(field) + ':' for field in fields]
+            if isinstance(chunk[0], dict):
+                chunk = [[record[field] for field in fields] for record in chunk]
+
+            if format == 'csv':
+                text = io.StringIO()
+                csv.writer(text, lineterminator='\n').writerows(chunk)
+                output.write(text.getvalue().encode('utf-8'))
+            else:
+                lines = ['{' + ','.join([key + _json_value(value) for key, value in zip(keys, record)]) + '}\n'
+                         for record in chunk]
+                output.write(''.join(lines).encode('utf-8'))
+            count += len(chunk)
+    return count
+
+
+def _number_field(np, units, int_digits, decimals):
+    """
+    Render integers in 10 ** -decimals units as ASCII decimal numbers.
+
+    Returns a (n, width) byte matrix and a mask of the bytes to keep; leading
+    zeros and the sign of non-negative numbers are masked out.
+    """
+    units = units.astype(np.int64)
+    magnitude = np.abs(units)
+    powers = 10 ** np.arange(int_digits + decimals - 1, -1, -1, dtype=np.int64)
+    digits = (magnitude[:, None] // powers % 10).astype(np.uint8) + ord('0')
+
+    sign = np.full((len(units), 1), ord('-'), dtype=np.uint8)
+    keep_digits = np.ones(digits.shape, dtype=bool)
+    keep_digits[:, :int_digits - 1] = magnitude[:, None] >= powers[:int_digits - 1]
+    parts = [(sign, (units < 0)[:, None]), (digits[:, :int_digits], keep_digits[:, :int_digits])]
+    if decimals:
+        parts.append(_constant_field(np, '.', len(units)))
+        parts.append((digits[:, int_digits:], keep_digits[:, int_digits:]))
+    return (np.concatenate([matrix for matrix, _ in parts], axis=1),
+            np.concatenate([mask for _, mask in parts], axis=1))
+
+
+def _constant_field(np, text, rows):
+    """
+    Repeat a constant ASCII string on every row.
+    """
+    encoded = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    return np.broadcast_to(encoded, (rows, len(encoded))), np.ones((rows, len(encoded)), dtype=bool)
+
+
+def _lookup_field(np, codes, values):
+    """
+    Render ``values[code]`` for every code as ASCII.
+    """
+    width = max(len(value) for value in values)
+    table = np.zeros((len(values), width), dtype=np.uint8)
+    table_mask = np.zeros((len(values), width), dtype=bool)
+    for row, value in enumerate(values):
+        table[row, :len(value)] = np.frombuffer(value.encode('ascii'), dtype=np.uint8)
+        table_mask[row, :len(value)] = True
+    return table[codes], table_mask[codes]
+
+
+def export_columns(columns, path, format='csv', chunk_size=EXPORT_CHUNK_SIZE, compress=False, compresslevel=1):
+    """
+    Stream columnar profiles to a CSV or JSONL file with vectorized formatting.
+
+    Each chunk is rendered into one byte matrix with NumPy arithmetic and
+    written at once, so no per-row Python code runs. Latitudes are written
+    with 7 decimals and longitudes with 6, exact for Faker-distributed
+    coordinates.
+
+    Args:
+        columns (ProfileColumns): Columns as returned by ``generate_profiles_columnar``.
+        path (str): File to write.
+        format (str): One of ``EXPORT_FORMATS``.
+        chunk_size (int): Number of rows formatted and written at once.
+        compress (bool): If True, the file is gzip compressed.
+        compresslevel (int): gzip compression level, low by default to keep up with the formatter.
+
+    Returns:
+        int: The number of rows written.
+    """
+    np = _require_numpy()
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown export format {format!r}, expected one of {EXPORT_FORMATS}')
+
+    num_rows = len(columns.age)
+    with _open_export(path, compress, compresslevel) as output:
+        if format == 'csv':
+            output.write(b'age,lat,long,blood_type\n')
+        for start in range(0, num_rows, chunk_size):
+            stop = min(start + chunk_size, num_rows)
+            rows = stop - start
+            age = _number_field(np, columns.age[start:stop], 3, 0)
+            lat = _number_field(np, np.rint(columns.lat[start:stop] * 10 ** 7), 3, 7)
+            long = _number_field(np, np.rint(columns.long[start:stop] * 10 ** 6), 3, 6)
+            blood_type = _lookup_field(np, columns.blood_type[start:stop], BLOOD_GROUPS)
+            if format == 'csv':
+                parts = [age, _constant_field(np, ',', rows), lat, _constant_field(np, ',', rows), long,
+                         _constant_field(np, ',', rows), blood_type, _constant_field(np, '\n', rows)]
+            else:
+                parts = [_constant_field(np, '{"age":', rows), age, _constant_field(np, ',"lat":', rows), lat,
+                         _constant_field(np, ',"long":', rows), long, _constant_field(np, ',"blood_type":"', rows),
+                         blood_type, _constant_field(np, '"}\n', rows)]
+            matrix = np.concatenate([matrix for matrix, _ in parts], axis=1)
+            mask = np.concatenate([mask for _, mask in parts], axis=1)
+            output.write(matrix[mask].tobytes())
+    return num_rows
+
+
+def measure_import_time(module='session8', repeat=5):
+    """
+    Measure the cold import time of a module in fresh interpreters.
+
+    Args:
+        module (str): Name of the module to import.
+        repeat (int): Number of interpreters to start, the fastest one is reported.
+
+    Returns:
+        float: Fastest import time in seconds.
+    """
+    import subprocess
+
+    code = ('from time import perf_counter; start = perf_counter(); '
+            f'import {module}; print(perf_counter() - start)')
+    timings = [float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                    check=True).stdout)
+               for _ in range(repeat)]
+    return min(timings)
+
+
+# Storage representations of the profiles generated by the command line
+CLI_REPRESENTATIONS = ('namedtuple', 'counter', 'table', 'columnar')
+
+# Output formats of the command line summary
+CLI_FORMATS = ('json', 'text')
+
+
+def generation_summary(num_people=100000, num_companies=100, seed=None, workers=1, representation='namedtuple',
+                       backend='decimal'):
+    """
+    Generate profiles and companies and summarize their statistics and timings.
+
+    Profiles are reduced as streamed ``person_profile`` namedtuples with
+    ``generate_profile_stats_sharded``, either drawn with Faker
+    ('namedtuple') or taken from the counter-based stream of ``profile_at``
+    ('counter', so any profile of the run can be regenerated on its own),
+    stored in a ``ProfileTable`` (float coordinates, so not with the
+    'fixed' backend), or generated as NumPy columns (always float
+    coordinates, ``backend`` is ignored). Only the streamed
+    representations use ``workers``.
+
+    Args:
+        num_people (int): Number of profiles, 0 to skip them.
+        num_companies (int): Number of companies, 0 to skip them.
+        seed (int, optional): Seed of the run. A random seed is drawn if omitted.
+        workers (int): Number of processes generating streamed profiles.
+        representation (str): One of ``CLI_REPRESENTATIONS``.
+        backend (str): Numeric backend, one of ``NUMERIC_BACKENDS``.
+
+    Returns:
+        dict: The configuration, profile statistics, market values, the
+        seconds spent on each part and the peak RSS in bytes
+        (None where it cannot be measured).
+    """
+    if representation not in CLI_REPRESENTATIONS:
+        raise ValueError(f'Unknown representation {representation!r}, expected one of {CLI_REPRESENTATIONS}')
+    if representation == 'table' and backend == 'fixed':
+        raise ValueError("ProfileTable stores float degrees, use the 'decimal' or 'float' backend")
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    summary = {'config': {'profiles': num_people, 'companies': num_companies, 'seed': seed, 'workers': workers,
+                          'representation': representation, 'backend': backend}}
+    timings = summary['timings'] = {}
+    start = perf_counter()
+
+    if num_people:
+        if representation in ('namedtuple', 'counter'):
+            profile_summary = generate_profile_stats_sharded(num_people, workers, seed, backend,
+                                                             counter=representation == 'counter').summary()
+        elif representation == 'table':
+            profile_summary = ProfileTable(draw_profiles(make_fake(seed), num_people, backend)).summary()
+        else:
+            profile_summary = columnar_profile_stats(generate_profiles_columnar(num_people, seed))
+        summary['profiles'] = profile_summary._asdict()
+        timings['profiles_seconds'] = perf_counter() - start
+
+    if num_companies:
+        companies_start = perf_counter()
+        companies, total_weight = generate_companies(num_companies, seed=seed)
+        open_value, high_value, close_value = calculate_stock_market_value(companies, total_weight)
+        summary['market'] = {'open': open_value, 'high': high_value, 'close': close_value,
+                             'total_weight': total_weight}
+        timings['companies_seconds'] = perf_counter() - companies_start
+
+    timings['total_seconds'] = perf_counter() - start
+    summary['peak_rss_bytes'] = peak_rss_bytes()
+    return summary
+
+
+def main(argv=None):
+    """
+    Command line entry point, ``python -m session8 --help`` lists the options.
+
+    Prints the ``generation_summary`` of the requested run as JSON, or as
+    one ``key = value`` line per statistic with ``--format text``.
+    """
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog='python -m session8',
+                                     description='Generate fake profiles and companies and summarize them.')
+    parser.add_argument('--profiles', type=int, default=100000, help='number of profiles, 0 to skip them')
+    parser.add_argument('--companies', type=int, default=100, help='number of companies, 0 to skip them')
+    parser.add_argument('--seed', type=int, help='seed of the run, random if omitted')
+    parser.add_argument('--workers', type=int, default=1, help='processes generating namedtuple or counter profiles')
+    parser.add_argument('--representation', choices=CLI_REPRESENTATIONS, default='namedtuple')
+    parser.add_argument('--backend', choices=NUMERIC_BACKENDS, default='decimal')
+    parser.add_argument('--format', choices=CLI_FORMATS, default='json')
+    args = parser.parse_args(argv)
+    if args.representation == 'table' and args.backend == 'fixed':
+        parser.error("--representation table needs the 'decimal' or 'float' backend")
+
+    summary = generation_summary(args.profiles, args.companies, args.seed, args.workers, args.representation,
+                                 args.backend)
+    if args.format == 'json':
+        json.dump(summary, sys.stdout, indent=2, default=float)
+        print()
+    else:
+        for section, values in summary.items():
+            if isinstance(values, dict):
+                for key, value in values.items():
+                    print(f'{section}.{key} = {value}')
+            else:
+                print(f'{section} = {values}')
+
+
+# Module attributes created on first access by __getattr__
+_LAZY_MARKET_ATTRIBUTES = ('companies', 'total_weight', 'open_market_value', 'high_market_value',
+                           'close_market_value')
+
+
+def __getattr__(name):
+    """
+    Create the default Faker instance, providers and market values on first access.
+    """
+    if name == 'fake':
+        return get_fake()
+    if name in _PROVIDER_METHODS:
+        from faker.providers import BaseProvider
+
+        for provider_name, methods in _PROVIDER_METHODS.items():
+            globals()[provider_name] = type(provider_name, (methods, BaseProvider), {'__doc__': methods.__doc__})
+        return globals()[name]
+    if name in _LAZY_MARKET_ATTRIBUTES:
+        # Generate the companies and calculate the market values
+        companies, total_weight = generate_companies(100)
+        open_market_value, high_market_value, close_market_value = calculate_stock_market_value(
+            companies, total_weight)
+        globals().update(companies=companies, total_weight=total_weight, open_market_value=open_market_value,
+                         high_market_value=high_market_value, close_market_value=close_market_value)
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
-# Generate the companies and calculate the market values
-companies, total_weight = generate_companies(100)
-open_market_value, high_market_value, close_market_value = calculate_stock_market_value(companies, total_weight)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
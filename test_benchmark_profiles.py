@@ -0,0 +1,31 @@
+import json
+import pytest
+import benchmark_profiles
+
+
+@pytest.mark.parametrize('name', tuple(benchmark_profiles.REPRESENTATIONS))
+def test_run_benchmark_reports_every_metric(name):
+    if name == 'columnar':
+        pytest.importorskip('numpy')
+    result = benchmark_profiles.run_benchmark(name, 200, seed=1)
+    assert result['representation'] == name and result['num_people'] == 200
+    assert result['total_seconds'] >= result['generate_seconds'] >= 0
+    assert result['bytes_per_record'] > 0
+    assert result['peak_rss_bytes'] >= result['baseline_rss_bytes'] > 0
+
+def test_representations_agree_on_statistics():
+    summaries = [stats(build(100, 3)) for name, (build, stats) in benchmark_profiles.REPRESENTATIONS.items()
+                 if name not in ('table', 'columnar')]
+    assert all(summary == summaries[0] for summary in summaries)
+
+def test_bytes_per_record_excludes_faker_setup():
+    small = benchmark_profiles._bytes_per_record('table', 1000, 0)
+    large = benchmark_profiles._bytes_per_record('table', 10000, 0)
+    assert small == pytest.approx(large, rel=0.1)
+
+def test_main_writes_json(tmp_path):
+    output = tmp_path / 'results.json'
+    benchmark_profiles.main(['--sizes', '50', '--representations', 'namedtuple', 'slots',
+                             '--output', str(output)])
+    results = json.loads(output.read_text())
+    assert [result['representation'] for result in results] == ['namedtuple', 'slots']
@@ -6,6 +6,7 @@ from session8 import fake, time_the_fun, generate_fake_profiles_and_stats_tuple,
 from session8 import generate_companies, CompanyStock
 import session8
 import inspect
+import random
 import re
 import os
 
@@ -216,6 +217,949 @@ def test_generate_companies_stock_price_relation():
             "The 'close' price should be between 'open' and 'high' prices."
 
 
+def test_generate_profiles_columnar_dtypes_and_ranges():
+    np = pytest.importorskip('numpy')
+    columns = session8.generate_profiles_columnar(10000, seed=1)
+    assert columns.age.dtype == np.int8 and columns.blood_type.dtype == np.uint8
+    assert columns.lat.dtype == np.float64 and columns.long.dtype == np.float64
+    assert 0 <= columns.age.min() and columns.age.max() < 100
+    assert -90 <= columns.lat.min() and columns.lat.max() <= 90
+    assert -180 <= columns.long.min() and columns.long.max() <= 180
+    assert columns.blood_type.max() < len(session8.BLOOD_GROUPS)
+
+def test_columnar_profile_stats_matches_python_loop():
+    pytest.importorskip('numpy')
+    columns = session8.generate_profiles_columnar(1000, seed=2)
+    stats = session8.columnar_profile_stats(columns)
+    ages = [int(age) for age in columns.age]
+    assert stats.largest_age == max(ages)
+    assert stats.mean_age == pytest.approx(sum(ages) / len(ages))
+    assert stats.mean_lat == pytest.approx(sum(columns.lat.tolist()) / 1000)
+    assert sum(stats.blood_group_dict.values()) == 1000
+    assert stats.blood_group_dict[stats.largest_blood_type] == max(stats.blood_group_dict.values())
+
+
+def test_profile_stats_single_pass():
+    profiles = iter([person_profile(25, Decimal('10.0'), Decimal('20.0'), 'O+'),
+                     person_profile(35, Decimal('15.0'), Decimal('25.0'), 'A+'),
+                     person_profile(30, Decimal('20.0'), Decimal('30.0'), 'O+')])
+    summary = session8.ProfileStats().update(profiles).summary()
+    assert summary.mean_lat == Decimal('15.0')
+    assert summary.mean_long == Decimal('25.0')
+    assert summary.mean_age == 30
+    assert summary.largest_age == 35
+    assert summary.largest_blood_type == 'O+'
+    assert summary.blood_group_dict['O+'] == 2 and summary.blood_group_dict['A+'] == 1
+
+def test_profile_stats_merge_equals_whole():
+    profiles = [person_profile(age, Decimal(age), Decimal(-age), session8.BLOOD_GROUPS[age % 8])
+                for age in range(50)]
+    whole = session8.ProfileStats().update(profiles).summary()
+    left = session8.ProfileStats().update(profiles[:17])
+    right = session8.ProfileStats().update({'age': p.age, 'lat': p.lat, 'long': p.long, 'blood_type': p.blood_type}
+                                           for p in profiles[17:])
+    assert left.merge(right).summary() == whole
+
+def test_profile_stats_empty_raises():
+    with pytest.raises(ValueError):
+        session8.ProfileStats().summary()
+
+@patch('builtins.print')
+def test_generate_fake_profiles_streaming_mode(mock_print):
+    summary = generate_fake_profiles_and_stats_tuple(20, stream=True)
+    assert sum(summary.blood_group_dict.values()) == 20
+    assert mock_print.call_count == 7
+    summary = generate_fake_profiles_and_stats_dict(20, stream=True)
+    assert sum(summary.blood_group_dict.values()) == 20
+
+
+def test_sharded_stats_reproducible_across_worker_counts():
+    single = session8.generate_profile_stats_sharded(250, workers=1, seed=7, shard_size=40).summary()
+    pooled = session8.generate_profile_stats_sharded(250, workers=3, seed=7, shard_size=40).summary()
+    assert single == pooled
+    assert sum(single.blood_group_dict.values()) == 250
+
+def test_sharded_stats_from_concurrent_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    expected = session8.generate_profile_stats_sharded(2000, seed=5, backend='fixed', shard_size=100).summary()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: session8.generate_profile_stats_sharded(
+            2000, seed=5, backend='fixed', shard_size=100).summary(), range(8)))
+    assert all(result == expected for result in results)
+
+def test_sharded_stats_depend_on_seed():
+    first = session8.generate_profile_stats_sharded(100, seed=1, shard_size=30).summary()
+    second = session8.generate_profile_stats_sharded(100, seed=2, shard_size=30).summary()
+    assert first != second
+
+@patch('builtins.print')
+def test_generate_fake_profiles_workers_option(mock_print):
+    summary = generate_fake_profiles_and_stats_tuple(30, workers=2, seed=3)
+    assert summary == generate_fake_profiles_and_stats_dict(30, workers=1, seed=3)
+
+
+def test_numeric_backends_agree_on_rounded_means():
+    summaries = {backend: session8.generate_profile_stats_sharded(300, seed=5, backend=backend,
+                                                                  shard_size=70).summary()
+                 for backend in session8.NUMERIC_BACKENDS}
+    exact = summaries['decimal']
+    assert summaries['fixed'] == exact
+    assert round(summaries['float'].mean_lat, 6) == round(float(exact.mean_lat), 6)
+    assert round(summaries['float'].mean_long, 6) == round(float(exact.mean_long), 6)
+    assert summaries['float'].blood_group_dict == exact.blood_group_dict
+
+def test_float_backend_fsum_accuracy():
+    stats = session8.ProfileStats('float')
+    for _ in range(session8.FSUM_BUFFER_SIZE + 10):
+        stats.add(30, 0.1, 1e16, 'O+')
+        stats.add(30, 0.1, -1e16, 'O+')
+    assert stats.summary().mean_lat == pytest.approx(0.1, rel=1e-15)
+    assert stats.summary().mean_long == 0
+
+def test_numeric_backend_validation():
+    with pytest.raises(ValueError):
+        session8.ProfileStats('bfloat16')
+    with pytest.raises(ValueError):
+        session8.ProfileStats('float').merge(session8.ProfileStats('decimal'))
+
+
+@patch('builtins.print')
+def test_time_the_fun_record_mode(mock_print):
+    @time_the_fun(mode='record')
+    def recorded_func(value):
+        return value * 2
+
+    assert [recorded_func(i) for i in range(2000)][-1] == 3998
+    mock_print.assert_not_called()
+    report = session8.timing_report(f'{__name__}.test_time_the_fun_record_mode.<locals>.recorded_func')
+    summary = next(iter(report.values()))
+    assert summary['count'] == 2000
+    assert 0 < summary['p50_ns'] <= summary['p95_ns'] <= summary['p99_ns'] <= summary['max_ns']
+
+def test_timing_stats_percentiles_bounded_error():
+    stats = session8.TimingStats()
+    durations = list(range(1, 100001))
+    for duration in durations:
+        stats.record(duration)
+    for q in (50, 95, 99):
+        exact = durations[int(len(durations) * q / 100) - 1]
+        assert exact <= stats.percentile(q) <= exact * 1.07
+    assert stats.summary()['max_ns'] == 100000
+    assert len(stats.buckets) == session8._TIMING_BUCKETS
+
+def test_time_the_fun_off_and_async():
+    import asyncio
+
+    def plain():
+        return 1
+    assert time_the_fun(mode='off')(plain) is plain
+
+    @time_the_fun(mode='record')
+    async def coroutine_func():
+        await asyncio.sleep(0.001)
+        return 'done'
+
+    assert asyncio.run(coroutine_func()) == 'done'
+    summary = session8.timing_report(f'{__name__}.test_time_the_fun_off_and_async.<locals>.coroutine_func')
+    assert next(iter(summary.values()))['max_ns'] >= 1000000
+
+    with pytest.raises(ValueError):
+        time_the_fun(mode='loud')
+
+
+def test_profile_table_round_trip_and_stats():
+    profiles = [person_profile(25, 10.5, 20.25, 'O+'),
+                person_profile(35, 15.0, -25.5, 'A+'),
+                person_profile(30, 20.0, 30.0, 'O+')]
+    table = session8.ProfileTable(profiles)
+    table.append(person_profile(40, Decimal('-5.5'), Decimal('1.0'), 'AB-'))
+    assert len(table) == 4
+    assert list(table)[:3] == profiles and table[-1] == person_profile(40, -5.5, 1.0, 'AB-')
+    assert table.largest_age() == 40 and table.mean_age() == 32.5
+    assert table.mean_lat() == pytest.approx(10.0)
+    assert table.largest_blood_type() == 'O+'
+    assert table.summary().blood_group_dict['AB-'] == 1
+
+def test_profile_table_slices_share_storage():
+    table = session8.ProfileTable(person_profile(age, float(age), -float(age), session8.BLOOD_GROUPS[age % 8])
+                                  for age in range(20))
+    view = table[2:18:4]
+    assert view._age is table._age
+    assert [profile.age for profile in view] == [2, 6, 10, 14]
+    assert view[1:][0].age == 6 and table[::-1][0].age == 19
+    assert view.summary() == session8.ProfileStats().update(list(table)[2:18:4]).summary()
+    with pytest.raises(TypeError):
+        view.append(table[0])
+
+
+def test_import_defers_faker_numpy_and_market():
+    import subprocess
+    import sys
+    code = ('import sys, session8; '
+            'print(sorted(name for name in ("faker", "numpy", "concurrent.futures") if name in sys.modules)); '
+            'print("companies" in vars(session8)); '
+            'print(len(session8.companies), "faker" in sys.modules)')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.split('\n')[:3] == ['[]', 'False', '100 True']
+
+def test_lazy_module_attributes():
+    assert session8.get_fake() is session8.fake is fake
+    assert any(isinstance(provider, session8.BloodGroupProvider) for provider in fake.providers)
+    expected = session8.calculate_stock_market_value(session8.companies, session8.total_weight)
+    assert (session8.open_market_value, session8.high_market_value, session8.close_market_value) == expected
+    with pytest.raises(AttributeError):
+        session8.not_an_attribute
+
+@patch('builtins.print')
+def test_patched_fake_is_used_by_generators(mock_print):
+    summaries = []
+    for _ in range(2):
+        replacement = session8.make_fake(11)
+        with patch.object(session8, 'fake', replacement):
+            assert session8.get_fake() is replacement
+            summaries.append(generate_fake_profiles_and_stats_dict(50))
+    assert summaries[0] == summaries[1] and session8.get_fake() is fake
+
+def test_measure_import_time():
+    assert 0 < session8.measure_import_time(repeat=1) < 5
+
+
+def test_bulk_blood_groups_and_ages():
+    instance = session8.make_fake(11)
+    blood_groups = instance.blood_groups(1000)
+    ages = instance.random_ages(1000)
+    assert len(blood_groups) == len(ages) == 1000
+    assert set(blood_groups) <= set(session8.BLOOD_GROUPS)
+    assert all(0 <= age < 100 for age in ages)
+
+def test_bulk_draws_respect_weights():
+    instance = session8.make_fake(12)
+    assert set(instance.blood_groups(500, weights=[0, 0, 0, 0, 0, 0, 1, 0])) == {'O+'}
+    assert set(instance.random_ages(500, weights=[1 if age >= 90 else 0 for age in range(100)])) <= set(range(90, 100))
+    counts = instance.blood_groups(20000, weights=session8.BLOOD_GROUP_FREQUENCIES)
+    assert counts.count('O+') > counts.count('B+') > counts.count('AB-')
+
+def test_draw_profiles_batches_are_seeded():
+    first = list(session8.draw_profiles(session8.make_fake(13), session8.PROFILE_BATCH_SIZE + 5))
+    second = list(session8.draw_profiles(session8.make_fake(13), session8.PROFILE_BATCH_SIZE + 5))
+    assert first == second and len(first) == session8.PROFILE_BATCH_SIZE + 5
+    assert all(isinstance(profile, person_profile) for profile in first)
+
+
+def test_vectorized_market_value_matches_loop():
+    pytest.importorskip('numpy')
+    companies, total_weight = generate_companies(200)
+    prices, weights = session8.companies_to_arrays(companies)
+    assert prices.shape == (3, 200) and weights.shape == (200,)
+    expected = session8.calculate_stock_market_value(companies, total_weight)
+    assert session8.calculate_stock_market_value_vectorized(prices, weights, total_weight) == pytest.approx(expected)
+    assert session8.calculate_stock_market_value_vectorized(prices, weights) == pytest.approx(expected)
+
+def test_vectorized_market_value_scenarios():
+    np = pytest.importorskip('numpy')
+    companies, total_weight = generate_companies(50)
+    prices, weights = session8.companies_to_arrays(companies)
+    shocks = np.array([1.0, 0.9, 1.1])
+    scenarios = shocks[:, None, None] * prices
+    values = session8.calculate_stock_market_value_vectorized(scenarios, weights, total_weight)
+    assert values.shape == (3, 3)
+    baseline = session8.calculate_stock_market_value(companies, total_weight)
+    for shock, row in zip(shocks, values):
+        assert row == pytest.approx([value * shock for value in baseline])
+    with pytest.raises(ValueError):
+        session8.calculate_stock_market_value_vectorized(prices, weights[:-1])
+
+
+TICK_COMPANIES = [CompanyStock(f'Company {index}', f'SYM{index}', 100.0, 105.0, 100.0 + index, 1.0 + index)
+                  for index in range(5)]
+
+def test_ohlc_aggregator_bars():
+    ticks = [session8.Tick(0, 'SYM0', 10.0), session8.Tick(1, 'SYM0', 12.0), session8.Tick(2, 'SYM1', 5.0),
+             session8.Tick(3, 'SYM0', 9.0), session8.Tick(4, 'SYM0', 11.0), session8.Tick(5, 'SYM0', 20.0)]
+    aggregator = session8.OHLCBarAggregator(TICK_COMPANIES, bar_interval=5)
+    bars = list(aggregator.aggregate(ticks))
+    assert bars == [session8.OHLCBar('Company 0', 'SYM0', 10.0, 12.0, 11.0, 1.0, 9.0, 0)]
+    assert isinstance(bars[0], tuple) and bars[0].close == 11.0
+    remaining = sorted(aggregator.flush())
+    assert [(bar.symbol, bar.open, bar.bar_start) for bar in remaining] == [('SYM0', 20.0, 5), ('SYM1', 5.0, 0)]
+    assert aggregator.flush() == []
+
+def test_ohlc_aggregator_rejects_colliding_symbols():
+    colliding = [CompanyStock('Low Co', 'SAME', 100.0, 101.0, 100.0, 1.0),
+                 CompanyStock('High Co', 'SAME', 500.0, 501.0, 500.0, 1.0)]
+    with pytest.raises(ValueError):
+        session8.OHLCBarAggregator(colliding, bar_interval=10)
+    companies, _ = generate_companies(200, unique_symbols=True)
+    bars = session8.OHLCBarAggregator(companies, 100).aggregate(session8.simulate_ticks(companies, 1000, seed=1))
+    assert all(bar.name == companies[bar.symbol].name for bar in bars)
+
+def test_simulate_ticks_seeded_and_async():
+    import asyncio
+    ticks = list(session8.simulate_ticks(TICK_COMPANIES, 2000, seed=4))
+    assert ticks == list(session8.simulate_ticks(TICK_COMPANIES, 2000, seed=4))
+    assert [tick.timestamp for tick in ticks] == list(range(2000))
+    assert all(tick.price > 0 for tick in ticks)
+
+    async def collect():
+        return [tick async for tick in session8.simulate_ticks_async(TICK_COMPANIES, 2000, seed=4, yield_every=100)]
+    assert asyncio.run(collect()) == ticks
+
+def test_tick_batch_matches_streaming_aggregation():
+    pytest.importorskip('numpy')
+    batch, last_prices = session8.simulate_tick_batch([company.close for company in TICK_COMPANIES], 20000, seed=9)
+    bars = session8.aggregate_tick_batch(batch, TICK_COMPANIES, bar_interval=1000)
+    aggregator = session8.OHLCBarAggregator(TICK_COMPANIES, bar_interval=1000)
+    ticks = (session8.Tick(timestamp, TICK_COMPANIES[company].symbol, price)
+             for timestamp, company, price in zip(batch.timestamp.tolist(), batch.company.tolist(), batch.price.tolist()))
+    streamed = list(aggregator.aggregate(ticks)) + aggregator.flush()
+    key = lambda bar: (bar.symbol, bar.bar_start)
+    assert sorted(streamed, key=key) == sorted(bars, key=key)
+    assert all(bar.low <= min(bar.open, bar.close) <= max(bar.open, bar.close) <= bar.high for bar in bars)
+    for index, company in enumerate(TICK_COMPANIES):
+        assert last_prices[index] == max((bar for bar in bars if bar.symbol == company.symbol),
+                                         key=lambda bar: bar.bar_start).close
+
+
+def test_market_index_matches_full_recompute():
+    companies = list(TICK_COMPANIES)
+    index = session8.MarketIndex(companies)
+    expected = session8.calculate_stock_market_value(companies, sum(company.weight for company in companies))
+    assert index.value() == pytest.approx(expected)
+
+    index.update_price('SYM2', close=150.0)
+    index.update_price('SYM4', open=90.0, high=160.0)
+    new_company = CompanyStock('New Co', 'NEWC', 200.0, 220.0, 210.0, 3.0)
+    index.add_company(new_company)
+    index.remove_company('SYM0')
+    current = [index[company.symbol] for company in companies[1:]] + [new_company]
+    assert index['SYM2'].close == 150.0 and len(index) == 5 and 'SYM0' not in index
+    expected = session8.calculate_stock_market_value(current, sum(company.weight for company in current))
+    assert index.value() == pytest.approx(expected, rel=1e-12)
+    assert index.total_weight == pytest.approx(sum(company.weight for company in current))
+
+def test_market_index_drift_correction_and_errors():
+    index = session8.MarketIndex(TICK_COMPANIES, recompute_every=3)
+    for price in (101.0, 102.0, 103.0):
+        index.update_price('SYM1', close=price)
+    assert index._changes == 0
+    with pytest.raises(ValueError):
+        index.add_company(TICK_COMPANIES[0])
+    with pytest.raises(KeyError):
+        index.update_price('NOPE', close=1.0)
+    with pytest.raises(ValueError):
+        session8.MarketIndex([]).value()
+
+def test_market_index_from_generated_colliding_symbols():
+    companies, total_weight = generate_companies(3000)
+    assert len({company.symbol for company in companies}) < len(companies)
+    index = session8.MarketIndex.from_generated((companies, total_weight))
+    assert len(index) == len(companies)
+    assert index.value() == pytest.approx(session8.calculate_stock_market_value(companies, total_weight))
+    state = random.getstate()
+    first = session8.MarketIndex.from_generated((companies, total_weight), seed=4)
+    second = session8.MarketIndex.from_generated((companies, total_weight), seed=4)
+    assert random.getstate() == state and list(first._companies) == list(second._companies)
+
+
+def test_generate_companies_unique_symbols_registry():
+    registry, total_weight = generate_companies(300, unique_symbols=True)
+    symbols = registry.symbols()
+    assert isinstance(registry, session8.CompanyRegistry) and len(registry) == 300
+    assert len(set(symbols)) == 300
+    assert all(len(symbol) == 4 and symbol.isalpha() and symbol.isupper() for symbol in symbols)
+    assert [company.symbol for company in registry] == symbols
+    assert registry[symbols[7]].symbol == symbols[7] and symbols[7] in registry
+    assert registry.get('????') is None
+    assert session8.calculate_stock_market_value(registry, total_weight) == \
+        pytest.approx(session8.MarketIndex(registry).value())
+
+def test_aggregate_tick_batch_with_registry():
+    pytest.importorskip('numpy')
+    registry = session8.CompanyRegistry(TICK_COMPANIES)
+    assert registry[1] == TICK_COMPANIES[1] and registry[-1] == TICK_COMPANIES[-1]
+    batch, _ = session8.simulate_tick_batch([company.close for company in TICK_COMPANIES], 2000, seed=3)
+    assert session8.aggregate_tick_batch(batch, registry, 500) == \
+        session8.aggregate_tick_batch(batch, TICK_COMPANIES, 500)
+
+def test_unique_symbol_fallback():
+    taken = {'ABCD', 'AAAA'}
+    fallback = iter(['AAAA', 'AAAB', 'AAAC'])
+    assert session8._unique_symbol('Ab', taken, fallback) == 'AAAB'
+    assert session8._unique_symbol('A.B C', taken, fallback) == 'AAAC'
+    with pytest.raises(ValueError):
+        session8._unique_symbol('x', taken, fallback)
+    with pytest.raises(ValueError):
+        session8.CompanyRegistry([TICK_COMPANIES[0], TICK_COMPANIES[0]])
+
+
+def test_dataset_round_trip(tmp_path):
+    profiles = list(session8.draw_profiles(session8.make_fake(21), 500))
+    path = tmp_path / 'profiles.s8ds'
+    header = session8.save_dataset(path, profiles, TICK_COMPANIES)
+    assert header['num_profiles'] == 500 and header['num_companies'] == len(TICK_COMPANIES)
+    with session8.load_dataset(path) as dataset:
+        assert list(dataset.profiles()) == profiles
+        assert dataset.companies() == TICK_COMPANIES
+        assert dataset.profile(-1) == profiles[-1]
+        assert all(isinstance(column, memoryview) for column in dataset.columns.values())
+        assert dataset.columns['lat'].obj is dataset._mmap
+        assert list(dataset.columns['age']) == [profile.age for profile in profiles]
+
+def test_dataset_rejects_other_files(tmp_path):
+    path = tmp_path / 'not_a_dataset.bin'
+    path.write_bytes(b'hello world, this is not a dataset')
+    with pytest.raises(ValueError):
+        session8.load_dataset(path)
+    empty = tmp_path / 'empty.s8ds'
+    session8.save_dataset(empty)
+    with session8.load_dataset(empty) as dataset:
+        assert list(dataset.profiles()) == [] and dataset.companies() == []
+
+
+def test_export_records_csv_and_jsonl(tmp_path):
+    import csv
+    import gzip
+    import json
+    companies = [CompanyStock('Smith, Jones and "Lee"', 'SJLE', 100.5, 110.25, 105.0, 1.5)] + TICK_COMPANIES
+    path = tmp_path / 'companies.csv'
+    assert session8.export_records(iter(companies), path, chunk_size=2) == len(companies)
+    with open(path, newline='') as source:
+        rows = list(csv.DictReader(source))
+    assert rows[0]['name'] == companies[0].name and float(rows[0]['high']) == 110.25
+    assert len(rows) == len(companies)
+
+    profiles = list(session8.draw_profiles(session8.make_fake(31), 50))
+    path = tmp_path / 'profiles.jsonl.gz'
+    assert session8.export_records(profiles, path, 'jsonl', chunk_size=7, compress=True) == 50
+    with gzip.open(path, 'rt') as source:
+        lines = [json.loads(line, parse_float=Decimal) for line in source]
+    assert [person_profile(**line) for line in lines] == profiles
+
+    path = tmp_path / 'dicts.jsonl'
+    session8.export_records([profile._asdict() for profile in profiles], path, 'jsonl')
+    assert json.loads(path.read_text().splitlines()[3])['blood_type'] == profiles[3].blood_type
+    with pytest.raises(ValueError):
+        session8.export_records(profiles, path, 'xml')
+
+def test_export_columns_matches_values(tmp_path):
+    import csv
+    import json
+    np = pytest.importorskip('numpy')
+    columns = session8.generate_profiles_columnar(3000, seed=8)
+    columns = columns._replace(lat=np.concatenate(([0.0, -0.0000005, 90.0], columns.lat[3:])))
+    path = tmp_path / 'columns.csv'
+    assert session8.export_columns(columns, path, chunk_size=1000) == 3000
+    with open(path, newline='') as source:
+        rows = list(csv.DictReader(source))
+    assert [int(row['age']) for row in rows] == columns.age.tolist()
+    assert [float(row['lat']) for row in rows] == columns.lat.tolist()
+    assert [float(row['long']) for row in rows] == columns.long.tolist()
+    assert [row['blood_type'] for row in rows] == [session8.BLOOD_GROUPS[code] for code in columns.blood_type]
+
+    path = tmp_path / 'columns.jsonl'
+    session8.export_columns(columns, path, 'jsonl', chunk_size=999)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['long'] for line in lines] == columns.long.tolist()
+    assert lines[1]['lat'] == -0.0000005
+
+
+def test_agenerate_profiles_matches_sync_stats():
+    import asyncio
+
+    async def consume():
+        stats = session8.ProfileStats()
+        sizes = [len(batch) async for batch in session8.agenerate_profiles(2500, batch_size=1000, seed=41,
+                                                                            stats=stats)]
+        return sizes, stats.summary()
+
+    sizes, summary = asyncio.run(consume())
+    assert sizes == [1000, 1000, 500]
+    expected = session8.ProfileStats().update(session8.draw_profiles(session8.make_fake(41), 2500)).summary()
+    assert summary == expected
+
+def test_agenerate_profiles_keeps_faker_off_the_loop():
+    import asyncio
+    import threading
+
+    threads = []
+    make_fake = session8.make_fake
+
+    def recording_make_fake(seed=None):
+        threads.append(threading.current_thread())
+        return make_fake(seed)
+
+    async def consume():
+        stats = session8.ProfileStats()
+        return [batch async for batch in session8.agenerate_profiles(300, batch_size=100, seed=2, stats=stats)]
+
+    with patch.object(session8, 'make_fake', recording_make_fake):
+        batches = asyncio.run(consume())
+    assert threads and threading.main_thread() not in threads
+    assert [profile for batch in batches for profile in batch] == list(session8.draw_profiles(make_fake(2), 300))
+
+def test_agenerate_profiles_backpressure_and_cancellation():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    class CountingExecutor(ThreadPoolExecutor):
+        submitted = 0
+
+        def submit(self, *args, **kwargs):
+            CountingExecutor.submitted += 1
+            return super().submit(*args, **kwargs)
+
+    async def slow_consumer(executor):
+        async for _ in session8.agenerate_profiles(100000, batch_size=10, max_pending=2, executor=executor):
+            await asyncio.sleep(0.05)
+            break
+
+    async def cancelled_consumer(executor):
+        task = asyncio.ensure_future(slow_consumer(executor))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with CountingExecutor(max_workers=1) as executor:
+        asyncio.run(slow_consumer(executor))
+        # Faker set up, one batch consumed, at most two queued and one being drawn
+        assert CountingExecutor.submitted <= 5
+        asyncio.run(cancelled_consumer(executor))
+
+
+def test_agenerate_profiles_rejects_process_pools():
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    async def consume(executor):
+        return [batch async for batch in session8.agenerate_profiles(10, executor=executor)]
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(TypeError):
+            asyncio.run(consume(executor))
+
+
+def _max_rank_error(sketch, values):
+    import bisect
+    ordered = sorted(values)
+    return max(abs(bisect.bisect_left(ordered, sketch.quantile(q)) / len(ordered) - q)
+               for q in [step / 100 for step in range(1, 100)])
+
+def test_quantile_sketch_error_bound_and_memory():
+    import random
+    rnd = random.Random(5)
+    values = [rnd.gauss(0, 1) for _ in range(50000)]
+    sketch = session8.QuantileSketch(k=200, seed=5)
+    for value in values:
+        sketch.update(value)
+    assert _max_rank_error(sketch, values) <= 1.7 / 200
+    assert sum(len(compactor) for compactor in sketch.compactors) < 4 * 200
+
+    small = session8.QuantileSketch(k=200)
+    for value in range(100):
+        small.update(value)
+    assert small.quantile(0.5) == 49 and small.quantile(0.9) == 89 and small.quantile(1) == 99
+
+def test_quantile_sketch_merge():
+    import random
+    rnd = random.Random(6)
+    values = [rnd.random() for _ in range(40000)]
+    shards = [session8.QuantileSketch(seed=index) for index in range(4)]
+    for index, value in enumerate(values):
+        shards[index % 4].update(value)
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+    assert merged.count == 40000
+    assert _max_rank_error(merged, values) <= 1.7 / 200
+    with pytest.raises(ValueError):
+        merged.merge(session8.QuantileSketch(k=50))
+    with pytest.raises(ValueError):
+        session8.QuantileSketch().quantile(0.5)
+
+def test_profile_stats_quantiles():
+    profiles = list(session8.draw_profiles(session8.make_fake(7), 3000))
+    stats = session8.ProfileStats(quantiles=True).update(profiles)
+    ages = sorted(profile.age for profile in profiles)
+    assert abs(stats.quantile('age', 0.5) - ages[1500]) <= 2
+    assert set(stats.quantiles('lat')) == {0.5, 0.9, 0.99}
+    sharded = session8.generate_profile_stats_sharded(3000, seed=7, backend='fixed', shard_size=1000,
+                                                      quantiles=True)
+    assert isinstance(sharded.quantile('long', 0.9), Decimal)
+    with pytest.raises(ValueError):
+        session8.ProfileStats().quantile('age', 0.5)
+    with pytest.raises(ValueError):
+        session8.ProfileStats(quantiles=True).merge(session8.ProfileStats())
+
+
+def test_spatial_index_matches_brute_force():
+    profiles = list(session8.draw_profiles(session8.make_fake(8), 5000, backend='float'))
+    index = session8.SpatialIndex(profiles[:2500], cell_size=5)
+    index.extend(profiles[2500:])
+    assert len(index) == 5000
+
+    for lat, long, radius_km in [(10.0, 20.0, 1500), (89.0, 179.0, 800), (-30.0, -179.5, 1200)]:
+        distances = [session8.haversine_km(lat, long, p.lat, p.long) for p in profiles]
+        assert set(index.radius(lat, long, radius_km)) == {i for i, d in enumerate(distances) if d <= radius_km}
+        nearest = index.nearest(lat, long, k=5)
+        assert [i for _, i in nearest] == sorted(range(5000), key=distances.__getitem__)[:5]
+
+    assert set(index.bbox(-10, 170, 10, -170)) == {i for i, p in enumerate(profiles)
+                                                   if -10 <= p.lat <= 10 and (p.long >= 170 or p.long <= -170)}
+    assert set(index.bbox(0, 0, 20, 40)) == {i for i, p in enumerate(profiles)
+                                             if 0 <= p.lat <= 20 and 0 <= p.long <= 40}
+
+def test_spatial_index_scale_and_columns():
+    fixed = list(session8.draw_profiles(session8.make_fake(9), 1000, backend='fixed'))
+    floats = list(session8.draw_profiles(session8.make_fake(9), 1000, backend='float'))
+    by_fixed = session8.SpatialIndex(fixed, scale=session8.FIXED_POINT_SCALE)
+    by_float = session8.SpatialIndex(floats)
+    assert by_fixed.nearest(45, 90, k=3) == by_float.nearest(45, 90, k=3)
+
+    columns = session8.generate_profiles_columnar(2000, seed=3)
+    bulk = session8.SpatialIndex.from_columns(columns)
+    incremental = session8.SpatialIndex(zip(columns.age, columns.lat, columns.long, columns.blood_type))
+    assert bulk.radius(0, 0, 2000) == incremental.radius(0, 0, 2000)
+    assert bulk.insert(0.5, 0.5) == 2000 and bulk.nearest(0.5, 0.5)[0] == (0.0, 2000)
+
+
+def test_group_by_columnar_matches_rows():
+    columns = session8.generate_profiles_columnar(5000, seed=4)
+    rows = [person_profile(int(age), float(lat), float(long), session8.BLOOD_GROUPS[code])
+            for age, lat, long, code in zip(*columns)]
+    by = {'blood': 'blood_type', 'band': session8.age_band(10), 'blood_age': ('blood_type', 'age')}
+    expected = session8.group_profiles(rows, by)
+    result = session8.group_profiles(columns, by)
+    assert set(expected['band']) == set(range(0, 100, 10))
+    for name in by:
+        assert result[name].keys() == expected[name].keys()
+        for key, aggregates in expected[name].items():
+            assert result[name][key] == pytest.approx(aggregates)
+    assert session8.columnar_group_by(columns, 'lat', fields=('age',), aggregates=('count',)) == \
+        session8.group_profiles(rows, 'lat', fields=('age',), aggregates=('count',))
+
+def test_group_by_stats_merge_and_exact_sums():
+    profiles = list(session8.draw_profiles(session8.make_fake(10), 2000))
+    whole = session8.GroupByStats('blood_type').update(profiles)
+    merged = session8.GroupByStats('blood_type').update(profiles[:700])
+    merged.merge(session8.GroupByStats('blood_type').update(p._asdict() for p in profiles[700:]))
+    assert merged.result() == whole.result()
+
+    group = whole.result()['blood_type']['O+']
+    members = [p for p in profiles if p.blood_type == 'O+']
+    assert group['count'] == len(members)
+    assert group['sum_lat'] == sum(p.lat for p in members) and isinstance(group['mean_lat'], Decimal)
+    assert group['max_age'] == max(p.age for p in members)
+    assert group['min_long'] == min(p.long for p in members)
+
+    with pytest.raises(ValueError):
+        session8.GroupByStats('age', aggregates=('median',))
+    with pytest.raises(ValueError):
+        whole.merge(session8.GroupByStats('age'))
+
+
+def test_company_name_pool_persistence(tmp_path):
+    path = str(tmp_path / 'names.json')
+    pool = session8.CompanyNamePool(50, path=path, seed=1)
+    assert len(set(pool)) == 50
+
+    reloaded = session8.CompanyNamePool(50, path=path)
+    assert reloaded.names == pool.names and reloaded._fake is None
+    grown = session8.CompanyNamePool(60, path=path, seed=2)
+    assert grown.names[:50] == pool.names and len(set(grown)) == 60
+    assert session8.CompanyNamePool(60, path=path).names == grown.names
+
+    kept = set(grown.refresh(0.5))
+    assert len(kept) == 60 and len(kept & set(pool)) <= 30
+    assert session8.CompanyNamePool(60, path=path).names == grown.names
+    assert set(session8.CompanyNamePool(60, path=path, max_age=-1, seed=3)) != kept
+
+def test_generate_companies_from_name_pool():
+    pool = session8.CompanyNamePool(30, seed=4)
+    companies, total_weight = generate_companies(30, unique_symbols=True, name_pool=pool)
+    assert sorted(company.name for company in companies) == sorted(pool)
+    companies, _ = generate_companies(100, name_pool=pool)
+    assert len(companies) == 100 and {company.name for company in companies} <= set(pool)
+
+def test_company_name_pool_refresh_is_reproducible():
+    state = random.getstate()
+    refreshed = [session8.CompanyNamePool(40, seed=6).refresh(0.5).names for _ in range(2)]
+    assert refreshed[0] == refreshed[1] and random.getstate() == state
+    explicit = session8.CompanyNamePool(40, seed=6).refresh(0.5, rnd=random.Random(1)).names
+    assert explicit == session8.CompanyNamePool(40, seed=6).refresh(0.5, rnd=random.Random(1)).names
+
+
+def test_profile_at_matches_sequential_range():
+    sequential = list(session8.profiles_range(42, 0, 500))
+    assert [session8.profile_at(42, index) for index in (499, 0, 250)] == [sequential[i] for i in (499, 0, 250)]
+    assert list(session8.profiles_range(42, 200, 300)) == sequential[200:300]
+    assert session8.profile_at('42', 0) != sequential[0]
+    assert all(-90 <= p.lat <= 90 and -180 <= p.long <= 180 and p.age in session8.AGES for p in sequential)
+
+    decimal, floating, fixed = (session8.profile_at(42, 10 ** 9, backend) for backend in session8.NUMERIC_BACKENDS)
+    assert decimal.lat == Decimal(fixed.lat) / session8.FIXED_POINT_SCALE == Decimal(str(floating.lat))
+    assert decimal.long.as_tuple().exponent == -6
+    with pytest.raises(ValueError):
+        session8.profile_at(42, -1)
+
+def test_profiles_range_columnar_matches_profiles():
+    columns = session8.profiles_range_columnar(7, 1000, 3000)
+    expected = list(session8.profiles_range(7, 1000, 3000, backend='float'))
+    assert [person_profile(int(age), float(lat), float(long), session8.BLOOD_GROUPS[code])
+            for age, lat, long, code in zip(*columns)] == expected
+    assert len(session8.profiles_range_columnar(7, 5, 5).age) == 0
+
+
+def test_sharded_counter_stats_match_profiles_range():
+    expected = session8.ProfileStats('fixed').update(session8.profiles_range(9, 0, 250, 'fixed')).summary()
+    single = session8.generate_profile_stats_sharded(250, seed=9, backend='fixed', shard_size=40, counter=True)
+    pooled = session8.generate_profile_stats_sharded(250, workers=2, seed=9, backend='fixed', counter=True)
+    assert single.summary() == pooled.summary() == expected
+    counter = session8.generation_summary(250, 0, seed=9, representation='counter', backend='fixed')
+    assert counter['profiles'] == expected._asdict()
+    assert counter['profiles'] != session8.generation_summary(250, 0, seed=9, backend='fixed')['profiles']
+
+
+def test_time_the_fun_profile_sampling(tmp_path):
+    import pstats
+
+    def squares(n):
+        return sum(i * i for i in range(n))
+
+    dumped = []
+
+    @time_the_fun(mode='record', profile_every=4, profile_output=lambda name, stats: dumped.append(name))
+    def sampled(n):
+        return squares(n)
+
+    assert [sampled(100) for _ in range(10)][-1] == 328350
+    name = f'{__name__}.test_time_the_fun_profile_sampling.<locals>.sampled'
+    report = session8.profile_report(name)[name]
+    assert report['samples'] == 2 and dumped == [name, name]
+    assert any('(squares)' in row['function'] and row['calls'] == 2 for row in report['hot_functions'])
+    assert session8.timing_report(name)[name]['count'] == 10
+
+    @time_the_fun(mode='off', profile_every=1, profile_output=str(tmp_path / '{name}.prof'))
+    def outer():
+        return nested()
+
+    @time_the_fun(mode='off', profile_every=1)
+    def nested():
+        return squares(10)
+
+    outer()
+    outer_name = f'{__name__}.test_time_the_fun_profile_sampling.<locals>.outer'
+    assert pstats.Stats(str(tmp_path / f'{outer_name}.prof')).total_calls > 0
+    assert session8.profile_registry[outer_name.replace('outer', 'nested')].samples == 0
+    with pytest.raises(ValueError):
+        time_the_fun(profile_every=0)
+
+
+def test_time_the_fun_profile_sampling_leaves_outer_profiler():
+    import cProfile
+    import pstats
+
+    def marker():
+        return 1
+
+    @time_the_fun(mode='off', profile_every=1)
+    def sampled():
+        return marker()
+
+    outer = cProfile.Profile()
+    outer.enable()
+    try:
+        sampled()
+        marker()
+    finally:
+        outer.disable()
+    name = f'{__name__}.test_time_the_fun_profile_sampling_leaves_outer_profiler.<locals>.sampled'
+    assert session8.profile_registry[name].samples == 0
+    calls = {function[2]: stat[1] for function, stat in pstats.Stats(outer).stats.items()}
+    assert calls['marker'] == 2
+
+
+def test_time_the_fun_profile_sampling_coroutine_steps():
+    import asyncio
+
+    def busy():
+        return sum(range(1000))
+
+    async def other_task():
+        for _ in range(5):
+            busy()
+            await asyncio.sleep(0)
+
+    def own_step():
+        return 2
+
+    @time_the_fun(mode='off', profile_every=1)
+    async def sampled():
+        own_step()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return own_step()
+
+    async def main():
+        return await asyncio.gather(sampled(), other_task())
+
+    assert asyncio.run(main())[0] == 2
+    name = f'{__name__}.test_time_the_fun_profile_sampling_coroutine_steps.<locals>.sampled'
+    functions = {function[2]: stat[1] for function, stat in session8.profile_registry[name].stats.stats.items()}
+    assert functions['own_step'] == 2 and 'busy' not in functions
+
+
+def test_track_memory_registry_and_nesting():
+    import tracemalloc
+
+    @session8.track_memory
+    def allocate(size):
+        return len(bytearray(size))
+
+    @session8.track_memory
+    def outer():
+        buffer = bytearray(4000000)
+        del buffer
+        return allocate(1000000)
+
+    assert outer() == 1000000 and not tracemalloc.is_tracing()
+    prefix = f'{__name__}.test_track_memory_registry_and_nesting.<locals>'
+    report = session8.memory_report()
+    assert 1000000 <= report[f'{prefix}.allocate']['max_peak_bytes'] < 1100000
+    assert 4000000 <= report[f'{prefix}.outer']['max_peak_bytes'] < 4100000
+    assert report[f'{prefix}.outer']['count'] == 1
+
+def test_track_memory_budget():
+    @session8.track_memory(budget=100000)
+    def wasteful():
+        return len(bytearray(1000000))
+
+    with pytest.raises(MemoryError):
+        wasteful()
+
+    @session8.track_memory(budget=100000, fallback={'stream': True})
+    def profiles(num_people, stream=False):
+        return list(range(num_people)) if not stream else num_people
+
+    assert profiles(50000) == list(range(50000))
+    assert profiles(50000) == 50000
+    name = f'{__name__}.test_track_memory_budget.<locals>.profiles'
+    summary = session8.memory_report(name)[name]
+    assert summary['exceeded'] == 1 and summary['fallback_active'] and summary['count'] == 2
+
+
+def test_track_memory_interleaved_coroutines():
+    import asyncio
+    import tracemalloc
+
+    @session8.track_memory
+    async def hungry():
+        await asyncio.sleep(0)
+        buffer = bytearray(5000000)
+        await asyncio.sleep(0.01)
+        return len(buffer)
+
+    @session8.track_memory(budget=1000000)
+    async def frugal():
+        await asyncio.sleep(0.02)
+        return 0
+
+    async def main():
+        return await asyncio.gather(hungry(), frugal())
+
+    assert asyncio.run(main()) == [5000000, 0] and not tracemalloc.is_tracing()
+    name = f'{__name__}.test_track_memory_interleaved_coroutines.<locals>.frugal'
+    summary = session8.memory_report(name)[name]
+    assert summary['concurrent'] == 1 and summary['exceeded'] == 0 and summary['count'] == 0
+    assert asyncio.run(frugal()) == 0
+    summary = session8.memory_report(name)[name]
+    assert summary['count'] == 1 and summary['max_peak_bytes'] < 1000000
+
+
+def test_generation_summary_representations():
+    first = session8.generation_summary(3000, 20, seed=5, backend='float')
+    again = session8.generation_summary(3000, 20, seed=5, backend='float')
+    assert first['profiles'] == again['profiles'] and first['market'] == again['market']
+    assert sum(first['profiles']['blood_group_dict'].values()) == 3000
+    assert first['timings']['total_seconds'] >= first['timings']['profiles_seconds'] > 0
+
+    table = session8.generation_summary(3000, 0, seed=5, representation='table')
+    columnar = session8.generation_summary(3000, 0, seed=5, representation='columnar')
+    assert 'market' not in table and table['profiles']['largest_age'] <= 99
+    assert sum(columnar['profiles']['blood_group_dict'].values()) == 3000
+    with pytest.raises(ValueError):
+        session8.generation_summary(10, 0, representation='table', backend='fixed')
+
+def test_command_line_entry_point(capsys):
+    import json
+    import subprocess
+    import sys
+
+    session8.main(['--profiles', '500', '--companies', '5', '--seed', '1', '--format', 'text'])
+    lines = capsys.readouterr().out.splitlines()
+    assert 'config.profiles = 500' in lines and any(line.startswith('market.close = ') for line in lines)
+
+    output = subprocess.run([sys.executable, '-m', 'session8', '--profiles', '1000', '--companies', '10',
+                             '--seed', '2', '--backend', 'fixed'], capture_output=True, text=True, check=True)
+    summary = json.loads(output.stdout)
+    assert summary['config']['backend'] == 'fixed' and summary['profiles']['largest_age'] <= 99
+    expected = session8.generation_summary(1000, 0, seed=2, backend='fixed')['profiles']
+    assert summary['profiles']['mean_lat'] == float(expected['mean_lat'])
+
+
+def test_sub_indices_match_per_basket_market_values():
+    symbols = [company.symbol for company in TICK_COMPANIES]
+    companies = session8.assign_baskets(TICK_COMPANIES, baskets={'first': symbols[:3], 'odd': symbols[1::2]}, seed=1)
+    assert all(company.baskets[0] in session8.SECTORS for company in companies)
+    assert companies[1].baskets[1:] == ('first', 'odd')
+
+    sub_indices = session8.calculate_sub_indices(companies)
+    assert set(sub_indices) == {'first', 'odd'} | {company.baskets[0] for company in companies}
+    for basket, values in sub_indices.items():
+        members = [company for company in companies if basket in company.baskets]
+        expected = session8.calculate_stock_market_value(members, sum(company.weight for company in members))
+        assert values == pytest.approx(expected)
+
+    arrays = session8.companies_to_arrays(companies)
+    membership = session8.basket_membership(companies)
+    vectorized = session8.calculate_sub_indices_vectorized(arrays.prices, arrays.weights, membership)
+    assert vectorized.shape == (3, len(sub_indices))
+    for column, basket in enumerate(membership.names):
+        assert tuple(vectorized[:, column]) == pytest.approx(sub_indices[basket])
+
+    scenarios = session8.calculate_sub_indices_vectorized([arrays.prices, arrays.prices * 2], arrays.weights, membership)
+    assert scenarios.shape == (2, 3, len(sub_indices)) and scenarios[1] == pytest.approx(vectorized * 2)
+
+
+def test_sub_indices_count_repeated_memberships_once():
+    companies = session8.assign_baskets(TICK_COMPANIES[:2], sectors=('Energy',),
+                                        baskets={'Energy': ['SYM0'], 'pair': ['SYM1', 'SYM1', 'SYM0']})
+    assert [company.baskets for company in companies] == [('Energy', 'pair'), ('Energy', 'pair')]
+    hand_built = [companies[0]._replace(baskets=('Energy', 'Energy')), companies[1]]
+    expected = session8.calculate_stock_market_value(TICK_COMPANIES[:2], 3.0)
+    for records in (companies, hand_built):
+        assert session8.calculate_sub_indices(records)['Energy'] == pytest.approx(expected)
+        arrays = session8.companies_to_arrays(records)
+        membership = session8.basket_membership(records)
+        assert len(membership.company) == (4 if records is companies else 3)
+        values = session8.calculate_sub_indices_vectorized(arrays.prices, arrays.weights, membership)
+        assert tuple(values[:, membership.names.index('Energy')]) == pytest.approx(expected)
+
+
+def test_generation_summary_leaves_global_random_state():
+    import random
+
+    state = random.getstate()
+    fake_state = session8.get_fake().random.getstate()
+    summary = session8.generation_summary(100, 30, seed=6)
+    assert random.getstate() == state and session8.get_fake().random.getstate() == fake_state
+    assert summary['market'] == session8.generation_summary(0, 30, seed=6)['market']
+    assert summary['peak_rss_bytes'] is None or summary['peak_rss_bytes'] > 2 ** 20
+    companies, _ = generate_companies(30, seed=6)
+    assert companies == generate_companies(30, seed=6)[0]
+
+
 if 0:
     import pytest
     import random